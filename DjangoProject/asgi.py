@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
+
+The notification stream (/notifications/stream/) needs an ASGI server,
+e.g. ``uvicorn DjangoProject.asgi:application``; under WSGI the browser
+falls back to polling.
 """
 
 import os
@@ -5,10 +5,10 @@ from django.views.generic import TemplateView
 from django.contrib import admin
 from django.contrib.auth import views as auth_views
 
-from trips import views
+from trips import views, views_api
 from trips.views import event_detail_view
-from trips.views_api import delete_event_view, get_event_expenses, add_expense
-from trips.views_api import get_calendar_events_api
+from trips.views_api import delete_event_view, get_event_expenses, get_event_balances, add_expense, add_expenses_batch
+from trips.views_api import get_calendar_events_api, calendar_feed_ics, calendar_feed_token_api
 urlpatterns = [
     path('accounts/login/', LoginView.as_view(template_name='registration/login.html'), name='login'),
     path('accounts/logout/', LogoutView.as_view(), name='logout'),
@@ -30,14 +30,29 @@ urlpatterns = [
     path('home/', TemplateView.as_view(template_name='home.html'), name='home'),
     path('main/', TemplateView.as_view(template_name='main.html'), name='main'),
     path('profile/', TemplateView.as_view(template_name='profile.html'), name='profile'),
-    path('events/my/', TemplateView.as_view(template_name='my_events.html'), name='my_events'),
+    path('events/my/', views.my_events_view, name='my_events'),
     path('events/create/', TemplateView.as_view(template_name='create_event.html'), name='create_event'),
     path('events/<int:event_id>/', event_detail_view, name='event_detail'),
 
 path('events/<int:event_id>/delete/', delete_event_view, name='delete_event'),
 path('api/events/calendar/', get_calendar_events_api, name='calendar_events_api'),
+path('api/events/calendar/feed-token/', calendar_feed_token_api, name='calendar_feed_token_api'),
+path('calendar/feed/<str:token>.ics', calendar_feed_ics, name='calendar_feed_ics'),
+path('api/events/map/', views_api.get_map_events_api, name='map_events_api'),
+path('api/events/map/clusters/', views_api.get_map_clusters_api, name='map_clusters_api'),
+path('api/geocode/', views_api.geocode_api, name='geocode_api'),
+path('api/events/search/', views_api.search_events_api, name='search_events_api'),
 path('api/events/<int:event_id>/expenses/', get_event_expenses, name='event_expenses'),
 path('api/events/<int:event_id>/expenses/add/', add_expense, name='add_expense'),
+path('api/events/<int:event_id>/expenses/batch/', add_expenses_batch, name='add_expenses_batch'),
+path('api/events/<int:event_id>/expenses/balances/', get_event_balances, name='event_balances'),
+path('api/profile/ledger/', views_api.get_my_ledger_api, name='my_ledger_api'),
+path('api/events/<int:event_id>/detail/', views_api.get_event_detail_api, name='event_detail_api'),
+path('api/events/<int:event_id>/tasks/', views_api.get_task_board, name='task_board'),
+path('api/events/<int:event_id>/tasks/add/', views_api.add_task, name='add_task'),
+path('api/events/<int:event_id>/tasks/move/', views_api.move_tasks_batch, name='move_tasks_batch'),
+path('api/events/<int:event_id>/tasks/<int:task_id>/edit/', views_api.edit_task, name='edit_task'),
+path('api/events/<int:event_id>/tasks/<int:task_id>/delete/', views_api.delete_task, name='delete_task'),
 
 path('api/events/<int:event_id>/participants/', views.get_event_participants_api, name='event_participants_api'),
 
@@ -55,6 +70,7 @@ path('api/events/<int:event_id>/participants/', views.get_event_participants_api
     path('friends/remove/<int:user_id>/', views.remove_friend_view, name='remove_friend'),
 
 path('events/<int:event_id>/invite/', views.invite_to_event_view, name='invite_to_event'),
+path('events/<int:event_id>/invite/batch/', views.invite_many_to_event_view, name='invite_many_to_event'),
 
     # Приглашения в мероприятия
     path('events/<int:event_id>/invite/<int:user_id>/', views.invite_friend_to_event_view,
@@ -77,6 +93,8 @@ path('events/invitation/<int:participant_id>/respond/', views.respond_to_invitat
 path('api/events/<int:event_id>/my-participant/', views.get_my_participant_api, name='my_participant_api'),
 
 path('notifications/', views.notifications_view, name='notifications'),
+path('notifications/stream/', views.notifications_stream, name='notifications_stream'),
+path('notifications/unread-count/', views.unread_count_api, name='unread_count_api'),
 path('notifications/api/', views.get_notifications_api, name='notifications_api'),
 
 path('notifications/clear/', views.clear_notifications_api, name='clear_notifications'),
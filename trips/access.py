@@ -0,0 +1,104 @@
+# trips/access.py
+"""Доступ к мероприятиям: роль пользователя в каждом его мероприятии.
+
+Роль - 'organizer' или статус участия. Роли всех мероприятий пользователя
+читаются одним запросом (организованные UNION участие) при первой проверке и
+запоминаются на время запроса (for_request). Дальше проверки во view и роли
+для списков (roles_for) запросов не стоят, а в чужое мероприятие мы даже не
+ходим в таблицу мероприятий.
+"""
+from django.db.models import CharField, IntegerField, Value
+
+from .listing import VISIBLE_STATUSES
+from .models import Event, EventParticipant
+
+ORGANIZER = 'organizer'
+# Организатор и подтвердившие участие: деньги, задачи, приглашения
+MEMBER_ROLES = {ORGANIZER, 'accepted', 'confirmed'}
+# Плюс приглашенные, пока не ответили: видят мероприятие и участников
+VIEWER_ROLES = {ORGANIZER, *VISIBLE_STATUSES}
+
+
+class EventAccess:
+    def __init__(self, user):
+        self.user = user
+        self._roles = None
+        self._participations = None
+
+    def _load(self):
+        # order_by() - сортировка из Meta в частях UNION недопустима
+        organized = Event.objects.filter(user=self.user).values_list(
+            'id', Value(ORGANIZER, output_field=CharField()), Value(None, output_field=IntegerField())
+        ).order_by()
+        joined = EventParticipant.objects.filter(user=self.user).values_list('event_id', 'status', 'id').order_by()
+        self._roles, self._participations = {}, {}
+        for event_id, role, participant_id in joined.union(organized, all=True):
+            if participant_id is not None:
+                self._participations[event_id] = (participant_id, role)
+            # Организатор важнее строки участника в своем же мероприятии
+            if self._roles.get(event_id) != ORGANIZER:
+                self._roles[event_id] = role
+
+    @property
+    def roles(self):
+        """{event_id: роль} по всем мероприятиям пользователя (включая неактивные)"""
+        if self._roles is None:
+            self._load()
+        return self._roles
+
+    def forget(self):
+        """Сбросить запомненное, если участие изменилось в этом же запросе"""
+        self._roles = self._participations = None
+
+    def role(self, event):
+        return self.roles.get(getattr(event, 'pk', event))
+
+    def participation(self, event):
+        """(id строки участника, статус) или (None, None), если пользователь не приглашен"""
+        if self._participations is None:
+            self._load()
+        return self._participations.get(getattr(event, 'pk', event), (None, None))
+
+    def participant_id(self, event):
+        return self.participation(event)[0]
+
+    def can_view(self, event):
+        return self.role(event) in VIEWER_ROLES
+
+    def is_member(self, event):
+        return self.role(event) in MEMBER_ROLES
+
+    def is_organizer(self, event):
+        return self.role(event) == ORGANIZER
+
+    def roles_for(self, events):
+        """{event_id: роль} для списка мероприятий (или их id) без запросов на каждое.
+
+        Объектам Event проставляются viewer_role и viewer_participant_id.
+        """
+        result = {}
+        for event in events:
+            event_id = getattr(event, 'pk', event)
+            result[event_id] = self.role(event_id)
+            if isinstance(event, Event):
+                event.viewer_role = result[event_id]
+                event.viewer_participant_id = self.participant_id(event_id)
+        return result
+
+    def get_event(self, event_id, roles=VIEWER_ROLES, queryset=None):
+        """Активное мероприятие, если роль пользователя в нем из roles, иначе None"""
+        if self.role(event_id) not in roles:
+            return None
+        queryset = Event.objects.all() if queryset is None else queryset
+        event = queryset.filter(id=event_id, is_active=True).first()
+        if event is not None:
+            self.roles_for([event])
+        return event
+
+
+def for_request(request):
+    """EventAccess текущего пользователя - один на запрос"""
+    access = getattr(request, '_event_access', None)
+    if access is None or access.user != request.user:
+        access = request._event_access = EventAccess(request.user)
+    return access
@@ -1,15 +1,22 @@
 # trips/admin.py
 from django.contrib import admin
 from .models import Event  # ← Импортируем только существующую модель
+from . import search
 
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
     list_display = ['title', 'user', 'event_type', 'start_datetime', 'location_type', 'is_active']
-    list_filter = ['event_type', 'location_type', 'is_active', 'start_datetime']
+    list_filter = ['event_type', 'location_type', 'recurrence_frequency', 'is_active', 'start_datetime']
     search_fields = ['title', 'description', 'address']
     list_per_page = 20
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо LIKE '%...%' по всей таблице
+        if not search_term or not search.is_supported():
+            return super().get_search_results(request, queryset, search_term)
+        return search.filter_matching(queryset, search_term), False
+
     fieldsets = (
         ('Основная информация', {
             'fields': ('user', 'title', 'description', 'event_type')
@@ -20,6 +27,10 @@ class EventAdmin(admin.ModelAdmin):
         ('Место проведения', {
             'fields': ('location_type', 'address', 'online_link', 'latitude', 'longitude')
         }),
+        ('Повторение', {
+            'fields': ('recurrence_frequency', 'recurrence_interval', 'recurrence_until',
+                       'recurrence_count', 'recurrence_exceptions')
+        }),
         ('Статус', {
             'fields': ('is_active',)
         }),
@@ -0,0 +1,203 @@
+# trips/clustering.py
+"""Кластеры мероприятий на карте.
+
+Для каждого пользователя, который видит мероприятие (организатор и участники),
+храним агрегаты по ячейкам геохеша на каждом уровне масштаба: количество,
+сумму координат (для центра) и несколько мероприятий-представителей.
+Агрегаты обновляются инкрементально из сигналов (trips/signals.py), полный
+пересчет - командой rebuild_map_clusters.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from . import geo
+from .listing import VISIBLE_STATUSES
+from .models import Event, EventParticipant, MapCluster
+
+# Длины геохеша, для которых храним кластеры
+CLUSTER_PRECISIONS = range(1, 7)
+
+# Сколько мероприятий-представителей храним в кластере
+REPRESENTATIVES = 5
+
+# Масштаб карты -> длина геохеша кластера (ячейка примерно 60 px на экране)
+ZOOM_PRECISIONS = [(2, 1), (4, 2), (6, 3), (9, 4), (11, 5), (13, 6)]
+# Масштабы, которые бывают у карты (Яндекс.Карты: 0..21)
+MIN_ZOOM, MAX_ZOOM = 0, 21
+
+
+def zoom_to_precision(zoom):
+    """Длина геохеша для масштаба; None - показываем отдельные точки"""
+    for max_zoom, precision in ZOOM_PRECISIONS:
+        if zoom <= max_zoom:
+            return precision
+    return None
+
+
+def map_point(event):
+    """(geohash, широта, долгота), если мероприятие должно быть на карте"""
+    if event.is_active and event.geohash and event.latitude is not None and event.longitude is not None:
+        return event.geohash, event.latitude, event.longitude
+    return None
+
+
+def member_ids(event):
+    """Пользователи, у которых мероприятие есть на карте"""
+    ids = set(EventParticipant.objects.filter(
+        event_id=event.pk,
+        status__in=VISIBLE_STATUSES
+    ).values_list('user_id', flat=True))
+    ids.add(event.user_id)
+    return ids
+
+
+def _refill(cluster, removed_event_id):
+    """Добираем представителей кластера вместо убранного мероприятия"""
+    low, high = geo.prefix_range(cluster.cell)
+    member_events = EventParticipant.objects.filter(
+        user_id=cluster.user_id,
+        status__in=VISIBLE_STATUSES
+    ).values('event_id')
+    candidates = Event.objects.filter(
+        Q(user_id=cluster.user_id) | Q(id__in=member_events),
+        is_active=True,
+        geohash__gte=low,
+        geohash__lt=high
+    ).exclude(id__in=cluster.event_ids + [removed_event_id]).order_by('id')
+    cluster.event_ids += list(candidates.values_list('id', flat=True)[:REPRESENTATIVES - len(cluster.event_ids)])
+
+
+def apply_point(user_ids, event_id, point, sign):
+    """Добавить (sign=1) или убрать (sign=-1) точку мероприятия из кластеров всех уровней"""
+    if not user_ids or point is None:
+        return
+    geohash, latitude, longitude = point
+    cells = [geohash[:precision] for precision in CLUSTER_PRECISIONS]
+
+    with transaction.atomic():
+        existing = {
+            (cluster.user_id, cluster.cell): cluster
+            for cluster in MapCluster.objects.select_for_update().filter(
+                user_id__in=user_ids,
+                precision__in=CLUSTER_PRECISIONS,
+                cell__in=cells
+            )
+        }
+
+        to_create, to_update, to_delete = [], [], []
+        for user_id in user_ids:
+            for precision, cell in zip(CLUSTER_PRECISIONS, cells):
+                cluster = existing.get((user_id, cell))
+                if sign > 0:
+                    if cluster is None:
+                        to_create.append(MapCluster(
+                            user_id=user_id, precision=precision, cell=cell, count=1,
+                            latitude_sum=latitude, longitude_sum=longitude, event_ids=[event_id]
+                        ))
+                        continue
+                    cluster.count += 1
+                    cluster.latitude_sum += latitude
+                    cluster.longitude_sum += longitude
+                    if event_id not in cluster.event_ids and len(cluster.event_ids) < REPRESENTATIVES:
+                        cluster.event_ids.append(event_id)
+                    to_update.append(cluster)
+                else:
+                    if cluster is None:
+                        continue
+                    if cluster.count <= 1:
+                        to_delete.append(cluster.pk)
+                        continue
+                    cluster.count -= 1
+                    cluster.latitude_sum -= latitude
+                    cluster.longitude_sum -= longitude
+                    if event_id in cluster.event_ids:
+                        cluster.event_ids.remove(event_id)
+                        _refill(cluster, event_id)
+                    to_update.append(cluster)
+
+        if to_create:
+            MapCluster.objects.bulk_create(to_create)
+        if to_update:
+            MapCluster.objects.bulk_update(to_update, ['count', 'latitude_sum', 'longitude_sum', 'event_ids'])
+        if to_delete:
+            MapCluster.objects.filter(pk__in=to_delete).delete()
+
+
+def move_point(user_ids, event_id, old_point, new_point):
+    """Мероприятие сменило место или видимость на карте"""
+    if old_point == new_point:
+        return
+    with transaction.atomic():
+        apply_point(user_ids, event_id, old_point, -1)
+        apply_point(user_ids, event_id, new_point, 1)
+
+
+def clusters_in_bbox(user, precision, south, west, north, east):
+    """Кластеры пользователя уровня precision, пересекающие прямоугольник"""
+    boxes = [(south, west, north, east)]
+    if west > east:
+        # Прямоугольник пересекает 180-й меридиан
+        boxes = [(south, west, north, 180.0), (south, -180.0, north, east)]
+
+    cells = Q()
+    prefixes = set()
+    for box in boxes:
+        prefixes |= {prefix[:precision] for prefix in geo.cover_bbox(*box)}
+    if '' not in prefixes:
+        for prefix in sorted(prefixes):
+            low, high = geo.prefix_range(prefix)
+            cells |= Q(cell__gte=low, cell__lt=high)
+
+    clusters = []
+    for cluster in MapCluster.objects.filter(cells, user=user, precision=precision):
+        cell_south, cell_west, cell_north, cell_east = geo.decode_bounds(cluster.cell)
+        if any(cell_south <= box[2] and cell_north >= box[0] and cell_west <= box[3] and cell_east >= box[1]
+               for box in boxes):
+            clusters.append(cluster)
+    return clusters
+
+
+def rebuild(chunk_size=1000):
+    """Полный пересчет кластеров по всем мероприятиям. Возвращает число кластеров"""
+    aggregates = {}
+    events = Event.objects.filter(is_active=True).exclude(geohash='').only(
+        'id', 'user_id', 'geohash', 'latitude', 'longitude', 'is_active'
+    ).order_by('id')
+    participants = EventParticipant.objects.filter(status__in=VISIBLE_STATUSES)
+
+    last_id = 0
+    while True:
+        chunk = list(events.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+
+        members = {}
+        for event_id, user_id in participants.filter(
+                event_id__in=[event.id for event in chunk]).values_list('event_id', 'user_id'):
+            members.setdefault(event_id, set()).add(user_id)
+
+        for event in chunk:
+            point = map_point(event)
+            if point is None:
+                continue
+            geohash, latitude, longitude = point
+            for user_id in members.get(event.id, set()) | {event.user_id}:
+                for precision in CLUSTER_PRECISIONS:
+                    key = (user_id, precision, geohash[:precision])
+                    aggregate = aggregates.setdefault(key, [0, 0.0, 0.0, []])
+                    aggregate[0] += 1
+                    aggregate[1] += latitude
+                    aggregate[2] += longitude
+                    if len(aggregate[3]) < REPRESENTATIVES:
+                        aggregate[3].append(event.id)
+
+    with transaction.atomic():
+        MapCluster.objects.all().delete()
+        MapCluster.objects.bulk_create(
+            (MapCluster(user_id=user_id, precision=precision, cell=cell, count=count,
+                        latitude_sum=latitude_sum, longitude_sum=longitude_sum, event_ids=event_ids)
+             for (user_id, precision, cell), (count, latitude_sum, longitude_sum, event_ids) in aggregates.items()),
+            batch_size=chunk_size
+        )
+    return len(aggregates)
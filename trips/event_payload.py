@@ -0,0 +1,141 @@
+# trips/event_payload.py
+"""Все данные страницы мероприятия одним ответом.
+
+Роль смотрящего берется из trips/access.py (роли всех его мероприятий -
+один запрос на запрос), мероприятие - еще один, дальше по одному запросу на
+каждую запрошенную секцию: участники, расходы (итоги считаются по тем же
+строкам), задачи доски, друзья для приглашения.
+"""
+from decimal import Decimal
+
+from . import tasks
+from .access import MEMBER_ROLES, ORGANIZER
+from .models import EventParticipant, Expense, Friendship
+
+SECTIONS = ('participants', 'expenses', 'tasks', 'friends')
+# Приглашенный, пока не ответил, видит мероприятие и участников, но не деньги, задачи
+# и друзей для приглашения (приглашать он тоже не может)
+MEMBER_SECTIONS = {'expenses', 'tasks', 'friends'}
+
+
+def parse_sections(value):
+    """Секции из ?sections=participants,expenses; пусто - все. ValueError для неизвестных"""
+    if not value:
+        return list(SECTIONS)
+    sections = list(dict.fromkeys(section.strip() for section in value.split(',') if section.strip()))
+    unknown = [section for section in sections if section not in SECTIONS]
+    if unknown:
+        raise ValueError(f'Неизвестные секции: {", ".join(unknown)}. Доступны: {", ".join(SECTIONS)}')
+    return sections
+
+
+def serialize_event(event):
+    return {
+        'id': event.id,
+        'title': event.title,
+        'description': event.description,
+        'type': event.event_type,
+        'type_display': event.get_event_type_display(),
+        'start': event.start_datetime.isoformat(),
+        'end': event.end_datetime.isoformat() if event.end_datetime else None,
+        'location_type': event.location_type,
+        'location': event.get_location_display(),
+        'address': event.address,
+        'online_link': event.online_link,
+        'lat': event.latitude,
+        'lng': event.longitude,
+        'is_recurring': event.is_recurring,
+        'organizer': {'id': event.user_id, 'username': event.user.username},
+    }
+
+
+def participants_section(event):
+    participants = EventParticipant.objects.filter(event=event).select_related('user', 'invited_by')
+    items = [{
+        'id': participant.id,
+        'user_id': participant.user_id,
+        'username': participant.user.username,
+        'role': participant.role,
+        'status': participant.status,
+        'status_display': participant.get_status_display(),
+        'invited_by': participant.invited_by.username if participant.invited_by else 'Организатор',
+        'created_at': participant.created_at.strftime('%d.%m.%Y %H:%M') if participant.created_at else ''
+    } for participant in participants]
+    return {'items': items, 'count': len(items)}
+
+
+def expenses_section(event):
+    event_expenses = Expense.objects.filter(event=event).select_related('paid_by').order_by('-created_at', '-id')
+    items = []
+    total = settled = Decimal('0')
+    paid_by = {}
+    for expense in event_expenses:
+        items.append({
+            'id': expense.id,
+            'title': expense.title,
+            'amount': float(expense.amount),
+            'paid_by': expense.paid_by.username,
+            'paid_by_id': expense.paid_by_id,
+            'created_at': expense.created_at.strftime('%d.%m.%Y'),
+            'is_settled': expense.is_settled
+        })
+        total += expense.amount
+        if expense.is_settled:
+            settled += expense.amount
+        payer = paid_by.setdefault(expense.paid_by_id, {
+            'user_id': expense.paid_by_id, 'username': expense.paid_by.username, 'amount': Decimal('0')
+        })
+        payer['amount'] += expense.amount
+    return {
+        'items': items,
+        'count': len(items),
+        'total': float(total),
+        'settled': float(settled),
+        'open': float(total - settled),
+        'by_payer': [dict(payer, amount=float(payer['amount']))
+                     for payer in sorted(paid_by.values(), key=lambda payer: payer['amount'], reverse=True)],
+    }
+
+
+def tasks_section(event):
+    columns = tasks.board(event)
+    return {
+        'columns': tasks.serialize_board(columns),
+        'count': sum(len(column) for column in columns.values()),
+    }
+
+
+def friends_section(event, user):
+    """Друзья смотрящего, которых еще нет в мероприятии"""
+    friends = Friendship.friends_of(user).exclude(id=event.user_id).exclude(
+        id__in=EventParticipant.objects.filter(event=event).values('user_id')
+    ).order_by('username').values('id', 'username', 'email')
+    items = list(friends)
+    return {'items': items, 'count': len(items)}
+
+
+def build_payload(event, user, sections):
+    """Ответ для страницы мероприятия: event, viewer и запрошенные секции.
+
+    event - из access.get_event, с проставленными viewer_role и viewer_participant_id.
+    """
+    payload = {
+        'event': serialize_event(event),
+        'viewer': {
+            'role': event.viewer_role,
+            'participant_id': event.viewer_participant_id,
+            'can_edit': event.viewer_role == ORGANIZER,
+        },
+    }
+    for section in sections:
+        if section in MEMBER_SECTIONS and event.viewer_role not in MEMBER_ROLES:
+            continue
+        if section == 'participants':
+            payload[section] = participants_section(event)
+        elif section == 'expenses':
+            payload[section] = expenses_section(event)
+        elif section == 'tasks':
+            payload[section] = tasks_section(event)
+        elif section == 'friends':
+            payload[section] = friends_section(event, user)
+    return payload
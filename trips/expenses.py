@@ -0,0 +1,163 @@
+# trips/expenses.py
+"""Расходы с разделением на доли: равные, точные суммы, проценты, веса.
+
+Доли считаются в копейках: каждому достается округленная вниз часть, а
+оставшиеся копейки получают участники с наибольшими дробными остатками -
+сумма долей всегда равна сумме расхода. Расход и все его доли создаются в
+одной транзакции, доли - одним bulk_create.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from . import ledger, settlement
+from .models import EventParticipant, Expense, ExpenseParticipant
+
+SPLIT_MODES = ('equal', 'exact', 'percent', 'weights')
+MAX_BATCH_EXPENSES = 200
+CENT = Decimal('0.01')
+
+
+def _max_value(field):
+    """Наибольшее значение, которое помещается в DecimalField (для 10, 2 - 99999999.99)"""
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - Decimal(10) ** -field.decimal_places
+
+
+# Больше не сохранить: SQLite запишет число, но прочитать его обратно уже не сможет
+MAX_AMOUNT = _max_value(Expense._meta.get_field('amount'))
+
+
+def to_decimal(value, name='Сумма'):
+    try:
+        result = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'{name}: неверное число {value!r}')
+    if not result.is_finite():
+        raise ValueError(f'{name}: неверное число {value!r}')
+    if abs(result) > MAX_AMOUNT:
+        raise ValueError(f'{name}: больше допустимого ({MAX_AMOUNT})')
+    return result
+
+
+def distribute(amount, weights):
+    """Делим amount пропорционально весам {user_id: вес} с точностью до копейки"""
+    total_weight = sum(weights.values())
+    if total_weight <= 0:
+        raise ValueError('Сумма весов должна быть больше нуля')
+    total_cents = int((amount / CENT).to_integral_value())
+
+    raw = {user_id: total_cents * weight / total_weight for user_id, weight in weights.items()}
+    cents = {user_id: int(value) for user_id, value in raw.items()}
+    left = total_cents - sum(cents.values())
+    # Лишние копейки - участникам с наибольшим дробным остатком (при равенстве - по порядку)
+    order = sorted(raw, key=lambda user_id: raw[user_id] - cents[user_id], reverse=True)
+    for user_id in order[:left]:
+        cents[user_id] += 1
+    return {user_id: Decimal(value) * CENT for user_id, value in cents.items()}
+
+
+def split(amount, mode, shares):
+    """{user_id: доля}. shares: для equal - список id, для остальных - {user_id: значение}"""
+    if mode not in SPLIT_MODES:
+        raise ValueError(f'Неизвестный способ разделения: {mode}')
+    if not shares:
+        raise ValueError('Не указаны участники расхода')
+
+    if mode == 'equal':
+        return distribute(amount, {user_id: Decimal(1) for user_id in shares})
+
+    values = {user_id: to_decimal(value, 'Доля') for user_id, value in shares.items()}
+    if any(value < 0 for value in values.values()):
+        raise ValueError('Доля не может быть отрицательной')
+
+    if mode == 'exact':
+        inexact = [value for value in values.values() if value.quantize(CENT) != value]
+        if inexact:
+            raise ValueError(f'Доля {inexact[0]}: не больше двух знаков после запятой')
+        if sum(values.values()) != amount:
+            raise ValueError(f'Сумма долей ({sum(values.values())}) не равна сумме расхода ({amount})')
+        return values
+    if mode == 'percent' and sum(values.values()) != 100:
+        raise ValueError('Сумма процентов должна быть равна 100')
+    return distribute(amount, values)
+
+
+def parse_split(data, member_ids):
+    """(mode, shares) из JSON: {"mode": "equal", "user_ids": [..]} или
+    {"mode": "exact"|"percent"|"weights", "shares": [{"user_id": .., "value": ..}]}.
+    Без split - поровну на всех участников мероприятия.
+    """
+    if not data:
+        return 'equal', sorted(member_ids)
+    mode = data.get('mode', 'equal')
+    if mode == 'equal':
+        user_ids = data.get('user_ids') or sorted(member_ids)
+        shares = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+        unknown = set(shares) - member_ids
+    else:
+        shares = {int(item['user_id']): item['value'] for item in data.get('shares', [])}
+        unknown = set(shares) - member_ids
+    if unknown:
+        raise ValueError('Среди участников расхода есть пользователи не из мероприятия')
+    return mode, shares
+
+
+def event_member_ids(event):
+    """Организатор и подтвердившие участие"""
+    ids = set(EventParticipant.objects.filter(
+        event=event,
+        status__in=['accepted', 'confirmed']
+    ).values_list('user_id', flat=True))
+    ids.add(event.user_id)
+    return ids
+
+
+def prepare(event, data, member_ids):
+    """Несохраненный Expense и его доли из JSON одного расхода"""
+    title = (data.get('title') or '').strip()
+    if not title:
+        raise ValueError('Укажите, на что потрачено')
+    amount = to_decimal(data.get('amount')).quantize(CENT)
+    if amount <= 0:
+        raise ValueError('Сумма должна быть больше нуля')
+    paid_by_id = int(data.get('paid_by_id'))
+    if paid_by_id not in member_ids:
+        raise ValueError('Оплативший должен быть участником мероприятия')
+
+    mode, shares = parse_split(data.get('split'), member_ids)
+    expense = Expense(event=event, title=title, amount=amount, paid_by_id=paid_by_id)
+    return expense, split(amount, mode, shares)
+
+
+def create_expenses(event, created_by, items):
+    """Создаем расходы пачкой: одна вставка расходов и одна вставка всех долей.
+
+    ValueError с номером расхода, если какой-то из них неверен - тогда не создается ничего.
+    """
+    member_ids = event_member_ids(event)
+    prepared = []
+    for index, data in enumerate(items, start=1):
+        try:
+            prepared.append(prepare(event, data, member_ids))
+        except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+            prefix = f'Расход {index}: ' if len(items) > 1 else ''
+            raise ValueError(f'{prefix}{e}')
+
+    with transaction.atomic():
+        for expense, _ in prepared:
+            expense.created_by = created_by
+        expenses = Expense.objects.bulk_create([expense for expense, _ in prepared])
+        ExpenseParticipant.objects.bulk_create([
+            ExpenseParticipant(expense=expense, user_id=user_id, share_amount=share_amount)
+            for expense, (_, shares) in zip(expenses, prepared)
+            for user_id, share_amount in shares.items()
+            if share_amount
+        ])
+        ledger.apply(ledger.collect(
+            (expense.paid_by_id, user_id, share_amount)
+            for expense, (_, shares) in zip(expenses, prepared)
+            for user_id, share_amount in shares.items()
+        ))
+        # bulk_create не вызывает сигналы - сбрасываем кэш балансов мероприятия сами
+        transaction.on_commit(lambda: settlement.invalidate(event.id))
+    return expenses
@@ -1,5 +1,6 @@
 # trips/forms.py
 from django import forms
+from . import geocoding
 from .models import Event, Friendship
 
 
@@ -21,7 +22,9 @@ class EventForm(forms.ModelForm):
             'title', 'description', 'event_type',
             'start_datetime', 'end_datetime',
             'location_type', 'address', 'online_link',
-            'latitude', 'longitude'
+            'latitude', 'longitude',
+            'recurrence_frequency', 'recurrence_interval',
+            'recurrence_until', 'recurrence_count'
         ]
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4}),
@@ -32,6 +35,15 @@ class EventForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields['latitude'].widget = forms.HiddenInput()
         self.fields['longitude'].widget = forms.HiddenInput()
+        # Повторение необязательно - старые клиенты его не присылают
+        self.fields['recurrence_frequency'].required = False
+        self.fields['recurrence_interval'].required = False
+
+    def clean_recurrence_frequency(self):
+        return self.cleaned_data.get('recurrence_frequency') or 'none'
+
+    def clean_recurrence_interval(self):
+        return self.cleaned_data.get('recurrence_interval') or 1
 
     def clean(self):
         cleaned_data = super().clean()
@@ -42,6 +54,14 @@ class EventForm(forms.ModelForm):
         if end_datetime and end_datetime < start_datetime:
             raise forms.ValidationError('Дата окончания не может быть раньше даты начала')
 
+        # Валидация повторения
+        if cleaned_data.get('recurrence_frequency') != 'none':
+            recurrence_until = cleaned_data.get('recurrence_until')
+            if recurrence_until and cleaned_data.get('recurrence_count'):
+                raise forms.ValidationError('Укажите либо дату окончания повторений, либо их количество')
+            if recurrence_until and start_datetime and recurrence_until < start_datetime.date():
+                raise forms.ValidationError('Повторения не могут заканчиваться раньше начала мероприятия')
+
         # Валидация места проведения
         if location_type == 'address' and not cleaned_data.get('address'):
             raise forms.ValidationError('Для типа "Адрес" укажите адрес')
@@ -50,6 +70,17 @@ class EventForm(forms.ModelForm):
         elif location_type == 'map' and (not cleaned_data.get('latitude') or not cleaned_data.get('longitude')):
             raise forms.ValidationError('Для типа "Точка на карте" выберите точку на карте')
 
+        if cleaned_data.get('latitude') is not None and cleaned_data.get('longitude') is not None:
+            if not geocoding.valid_coords(cleaned_data['latitude'], cleaned_data['longitude']):
+                raise forms.ValidationError('Неверные координаты точки')
+
+        # Адрес без координат - берем координаты из кэша геокодирования, чтобы мероприятие попало на карту
+        if location_type == 'address' and cleaned_data.get('latitude') is None:
+            result = geocoding.geocode(cleaned_data['address'])
+            if result is not None:
+                cleaned_data['latitude'] = result.latitude
+                cleaned_data['longitude'] = result.longitude
+
         return cleaned_data
 
 # trips/forms.py
@@ -103,7 +134,4 @@ class InviteFriendForm(forms.Form):
         if user:
             # Получаем только друзей пользователя
             from .models import Friendship
-            friend_ids = Friendship.objects.filter(
-                user=user, confirmed=True
-            ).values_list('friend_id', flat=True)
-            self.fields['friend'].queryset = User.objects.filter(id__in=friend_ids)
\ No newline at end of file
+            self.fields['friend'].queryset = Friendship.friends_of(user)
\ No newline at end of file
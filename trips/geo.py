@@ -0,0 +1,144 @@
+# trips/geo.py
+"""Геохеш и геометрия для поиска мероприятий на карте"""
+import math
+
+from django.db.models import ExpressionWrapper, F, FloatField, Q
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Точность хранимого геохеша: 9 символов ~ 5 метров
+GEOHASH_PRECISION = 9
+
+# Сколько ячеек геохеша максимум берем для покрытия области запроса
+MAX_COVER_CELLS = 32
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # биты чередуются, начиная с долготы
+
+    while len(chars) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            bounds[0] = middle
+        else:
+            bits <<= 1
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def decode_bounds(geohash):
+    """Границы ячейки геохеша (south, west, north, east)"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bounds = lon_range if even else lat_range
+            middle = (bounds[0] + bounds[1]) / 2
+            if value >> shift & 1:
+                bounds[0] = middle
+            else:
+                bounds[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def cell_size(precision):
+    """Размер ячейки (высота по широте, ширина по долготе) в градусах"""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def _cells_for(south, west, north, east, precision):
+    height, width = cell_size(precision)
+    # Привязываем к сетке, чтобы перебирать ровно по одной точке на ячейку
+    lat = math.floor((south + 90) / height) * height - 90 + height / 2
+    cells = set()
+    while lat - height / 2 <= north:
+        lon = math.floor((west + 180) / width) * width - 180 + width / 2
+        while lon - width / 2 <= east:
+            cells.add(encode(min(max(lat, -90.0), 90.0), min(max(lon, -180.0), 180.0), precision))
+            lon += width
+        lat += height
+    return cells
+
+
+def cover_bbox(south, west, north, east, max_cells=MAX_COVER_CELLS):
+    """Префиксы геохеша, покрывающие прямоугольник - самые длинные, которых не больше max_cells"""
+    best = {''}
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        height, width = cell_size(precision)
+        estimate = (math.ceil((north - south) / height) + 1) * (math.ceil((east - west) / width) + 1)
+        if estimate > max_cells:
+            break
+        cells = _cells_for(south, west, north, east, precision)
+        if len(cells) > max_cells:
+            break
+        best = cells
+    return best
+
+
+def prefix_range(prefix):
+    """Диапазон [low, high) строк с заданным префиксом - работает по обычному B-tree индексу"""
+    return prefix, prefix + '{'  # '{' идет сразу после 'z' в ASCII
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    """Описанный вокруг круга прямоугольник (south, west, north, east)"""
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    d_lon = min(math.degrees(radius_km / EARTH_RADIUS_KM) / cos_lat, 180.0)
+    return (max(latitude - d_lat, -90.0), max(longitude - d_lon, -180.0),
+            min(latitude + d_lat, 90.0), min(longitude + d_lon, 180.0))
+
+
+def bbox_q(south, west, north, east):
+    """Условие «точка внутри прямоугольника»: диапазоны геохеша по индексу + точная проверка координат"""
+    if west > east:
+        # Прямоугольник пересекает 180-й меридиан
+        return bbox_q(south, west, north, 180.0) | bbox_q(south, -180.0, north, east)
+
+    cells = Q()
+    prefixes = cover_bbox(south, west, north, east)
+    if prefixes != {''}:
+        for prefix in sorted(prefixes):
+            low, high = prefix_range(prefix)
+            cells |= Q(geohash__gte=low, geohash__lt=high)
+    return cells & Q(latitude__gte=south, latitude__lte=north, longitude__gte=west, longitude__lte=east)
+
+
+def squared_distance(latitude, longitude):
+    """Приближенный квадрат расстояния в градусах (равнопромежуточная проекция).
+
+    Только арифметика - считается самой БД для ORDER BY ... LIMIT на любом бэкенде.
+    """
+    k = math.cos(math.radians(latitude))
+    d_lat = F('latitude') - latitude
+    d_lon = (F('longitude') - longitude) * k
+    return ExpressionWrapper(d_lat * d_lat + d_lon * d_lon, output_field=FloatField())
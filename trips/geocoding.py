@@ -0,0 +1,193 @@
+# trips/geocoding.py
+"""Геокодирование адресов с кэшем.
+
+Порядок поиска: LRU в памяти процесса -> таблица GeocodeCache -> внешний
+геокодер из settings.GEOCODER (если настроен). Кэш общий для всех
+пользователей, а EventForm подставляет из него координаты в чужие
+мероприятия, поэтому пополняется только ответами серверного геокодера.
+Координаты от клиента (точка на карте, ymaps.geocode) сюда не попадают.
+"""
+import json
+import math
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import GeocodeCache
+
+# 4 знака после запятой ~ 11 метров: клики по одному зданию дают один ключ
+COORD_DIGITS = 4
+
+LRU_SIZE = 1024
+
+GeocodeResult = namedtuple('GeocodeResult', ['address', 'latitude', 'longitude'])
+
+
+def normalize_address(address):
+    """Ключ адреса: регистр, ё/е, пунктуация и лишние пробелы не важны"""
+    value = (address or '').lower().replace('ё', 'е')
+    return ' '.join(re.sub(r'[^\w]+', ' ', value).split())[:255]
+
+
+def valid_coords(latitude, longitude):
+    """Конечные числа в пределах -90..90 и -180..180"""
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return False
+    return (math.isfinite(latitude) and math.isfinite(longitude)
+            and -90 <= latitude <= 90 and -180 <= longitude <= 180)
+
+
+def coord_key(latitude, longitude):
+    return f'{latitude:.{COORD_DIGITS}f},{longitude:.{COORD_DIGITS}f}'
+
+
+class LRUCache:
+    """Небольшой потокобезопасный LRU-кэш в памяти процесса"""
+
+    def __init__(self, maxsize=LRU_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_by_address = LRUCache()
+_by_coords = LRUCache()
+
+
+class FixtureGeocoder:
+    """Геокодер-заглушка для тестов и разработки.
+
+    Отвечает по JSON-фикстуре вида [{"address": ..., "latitude": ..., "longitude": ...}].
+    Подключается так: GEOCODER = 'trips.geocoding.FixtureGeocoder',
+    GEOCODER_OPTIONS = {'path': 'путь/к/фикстуре.json'}.
+    """
+
+    def __init__(self, path=None, entries=None):
+        if entries is None:
+            with open(path, encoding='utf-8') as f:
+                entries = json.load(f)
+        self.entries = [GeocodeResult(e['address'], float(e['latitude']), float(e['longitude'])) for e in entries]
+        self._by_address = {normalize_address(e.address): e for e in self.entries}
+        self._by_coords = {coord_key(e.latitude, e.longitude): e for e in self.entries}
+
+    def geocode(self, address):
+        return self._by_address.get(normalize_address(address))
+
+    def reverse(self, latitude, longitude):
+        return self._by_coords.get(coord_key(latitude, longitude))
+
+
+_geocoder = None
+
+
+def get_geocoder():
+    """Внешний геокодер из настроек; None - работаем только по кэшу"""
+    global _geocoder
+    path = getattr(settings, 'GEOCODER', None)
+    if not path:
+        return None
+    if _geocoder is None or _geocoder[0] != path:
+        _geocoder = (path, import_string(path)(**getattr(settings, 'GEOCODER_OPTIONS', {})))
+    return _geocoder[1]
+
+
+def _result(row):
+    return GeocodeResult(row.address, row.latitude, row.longitude)
+
+
+def remember(address, latitude, longitude):
+    """Сохраняем пару адрес - координаты в оба уровня кэша. None - адрес пуст или координаты неверны"""
+    key = normalize_address(address)
+    if not key or not valid_coords(latitude, longitude):
+        return None
+    result = GeocodeResult(address.strip()[:255], float(latitude), float(longitude))
+    GeocodeCache.objects.update_or_create(
+        normalized_address=key,
+        defaults={
+            'address': result.address,
+            'latitude': result.latitude,
+            'longitude': result.longitude,
+            'coord_key': coord_key(result.latitude, result.longitude),
+        }
+    )
+    _by_address.set(key, result)
+    _by_coords.set(coord_key(result.latitude, result.longitude), result)
+    return result
+
+
+def geocode(address):
+    """Координаты адреса или None"""
+    key = normalize_address(address)
+    if not key:
+        return None
+
+    result = _by_address.get(key)
+    if result is not None:
+        return result
+
+    row = GeocodeCache.objects.filter(normalized_address=key).first()
+    if row is not None:
+        result = _result(row)
+        _by_address.set(key, result)
+        return result
+
+    geocoder = get_geocoder()
+    found = geocoder.geocode(address) if geocoder else None
+    if found is None:
+        return None
+    # Кэшируем под запрошенным адресом - так его и будут спрашивать в следующий раз
+    return remember(address, found.latitude, found.longitude)
+
+
+def reverse(latitude, longitude):
+    """Адрес точки или None"""
+    if not valid_coords(latitude, longitude):
+        return None
+    key = coord_key(latitude, longitude)
+
+    result = _by_coords.get(key)
+    if result is not None:
+        return result
+
+    row = GeocodeCache.objects.filter(coord_key=key).order_by('-updated_at').first()
+    if row is not None:
+        result = _result(row)
+        _by_coords.set(key, result)
+        return result
+
+    geocoder = get_geocoder()
+    found = geocoder.reverse(latitude, longitude) if geocoder else None
+    if found is None:
+        return None
+    result = remember(found.address, found.latitude, found.longitude)
+    # Ответ геокодера может указывать на соседнюю точку - запоминаем и исходный ключ
+    _by_coords.set(key, result)
+    return result
+
+
+def clear_memory_cache():
+    _by_address.clear()
+    _by_coords.clear()
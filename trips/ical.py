@@ -0,0 +1,115 @@
+# trips/ical.py
+"""Сериализация мероприятий в iCalendar (RFC 5545) для подписки из внешних календарей"""
+from datetime import datetime, time, timezone as dt_timezone
+from urllib.parse import urlsplit
+
+from django.utils import timezone
+
+RRULE_FREQUENCIES = {
+    'daily': 'DAILY',
+    'weekly': 'WEEKLY',
+    'monthly': 'MONTHLY',
+    'yearly': 'YEARLY',
+}
+
+
+def escape_text(value):
+    """Экранирование TEXT-значений: обратный слеш, ';', ',' и переводы строк"""
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold_line(line):
+    """Перенос строки длиннее 75 октетов (продолжение начинается с пробела)"""
+    if len(line.encode('utf-8')) <= 75:
+        return line + '\r\n'
+
+    parts = []
+    chunk = ''
+    size = 0
+    limit = 75
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > limit:
+            parts.append(chunk)
+            chunk = ''
+            size = 0
+            limit = 74  # с учетом ведущего пробела
+        chunk += char
+        size += char_size
+    parts.append(chunk)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def build_rrule(event):
+    """RRULE серии повторяющегося мероприятия"""
+    rule = [f'FREQ={RRULE_FREQUENCIES[event.recurrence_frequency]}']
+    if event.recurrence_interval and event.recurrence_interval > 1:
+        rule.append(f'INTERVAL={event.recurrence_interval}')
+    if event.recurrence_count:
+        rule.append(f'COUNT={event.recurrence_count}')
+    elif event.recurrence_until:
+        until = timezone.make_aware(datetime.combine(event.recurrence_until, time(23, 59, 59)))
+        rule.append(f'UNTIL={format_datetime(until)}')
+    return 'RRULE:' + ';'.join(rule)
+
+
+def build_exdates(event):
+    """EXDATE для исключенных дат: время совпадает со временем начала серии"""
+    start_time = timezone.localtime(event.start_datetime).time()
+    exdates = []
+    for value in sorted(event.recurrence_exceptions or []):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            continue
+        exdates.append(format_datetime(timezone.make_aware(datetime.combine(day, start_time))))
+    return exdates
+
+
+def event_to_vevent(event, base_url):
+    host = urlsplit(base_url).netloc
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.id}@{host}',
+        f'DTSTAMP:{format_datetime(event.updated_at)}',
+        f'LAST-MODIFIED:{format_datetime(event.updated_at)}',
+        f'DTSTART:{format_datetime(event.start_datetime)}',
+    ]
+    if event.end_datetime:
+        lines.append(f'DTEND:{format_datetime(event.end_datetime)}')
+    lines.append(f'SUMMARY:{escape_text(event.title)}')
+    if event.description:
+        lines.append(f'DESCRIPTION:{escape_text(event.description)}')
+    location = event.get_location_display()
+    if location:
+        lines.append(f'LOCATION:{escape_text(location)}')
+    if event.latitude is not None and event.longitude is not None:
+        lines.append(f'GEO:{event.latitude};{event.longitude}')
+    lines.append(f'URL:{base_url}/events/{event.id}/')
+    if event.is_recurring:
+        lines.append(build_rrule(event))
+        exdates = build_exdates(event)
+        if exdates:
+            lines.append('EXDATE:' + ','.join(exdates))
+    lines.append('END:VEVENT')
+    return ''.join(fold_line(line) for line in lines)
+
+
+def iter_calendar(events, base_url, name):
+    """Потоковая генерация календаря: VEVENT отдаются по одному, без сборки всего файла в памяти"""
+    yield ''.join(fold_line(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:-//{urlsplit(base_url).netloc}//Events//RU',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ])
+    for event in events:
+        yield event_to_vevent(event, base_url)
+    yield 'END:VCALENDAR\r\n'
@@ -0,0 +1,93 @@
+# trips/invitations.py
+"""Приглашения в мероприятие пачкой: проверки двумя запросами по множествам.
+
+Вместо «проверка дружбы, пользователь, существующее приглашение, вставка,
+уведомление» на каждого друга - один запрос на друзей, один на уже
+приглашенных, затем bulk_create участников и уведомлений.
+"""
+from django.db import transaction
+
+from . import clustering, notifications
+from .models import EventParticipant, Friendship
+
+DEFAULT_ROLE = 'Участник'
+MAX_BATCH_INVITES = 500
+ROLE_MAX_LENGTH = EventParticipant._meta.get_field('role').max_length
+
+
+def parse_invites(items, default_role=DEFAULT_ROLE):
+    """[(friend_id, role)] из [{'friend_id': .., 'role': ..}] или списка id; повторы отбрасываются"""
+    invites = {}
+    for item in items:
+        if isinstance(item, dict):
+            friend_id, role = item.get('friend_id'), item.get('role')
+        else:
+            friend_id, role = item, None
+        if not str(friend_id).isdigit():
+            raise ValueError(f'Неверный id друга: {friend_id}')
+        invites.setdefault(int(friend_id), (str(role).strip() if role else '') or default_role)
+    return list(invites.items())
+
+
+def invite_many(event, inviter, invites):
+    """Пригласить друзей [(friend_id, role)]. Результат по каждому другу в том же порядке.
+
+    Удачные: {'friend_id', 'success': True, 'participant': {...}},
+    неудачные: {'friend_id', 'success': False, 'error'}.
+    """
+    friend_ids = [friend_id for friend_id, _ in invites]
+    friends = dict(Friendship.friends_of(inviter).filter(id__in=friend_ids).values_list('id', 'username'))
+    invited = set(EventParticipant.objects.filter(
+        event=event,
+        user_id__in=friends
+    ).values_list('user_id', flat=True))
+
+    results = {}
+    to_create = []
+    for friend_id, role in invites:
+        if friend_id not in friends:
+            error = 'Пользователь не является вашим другом'
+        elif friend_id in invited:
+            error = f'{friends[friend_id]} уже приглашен'
+        elif len(role) > ROLE_MAX_LENGTH:
+            error = f'Роль не должна превышать {ROLE_MAX_LENGTH} символов'
+        else:
+            to_create.append(EventParticipant(
+                event=event,
+                user_id=friend_id,
+                invited_by=inviter,
+                status='invited',
+                role=role
+            ))
+            continue
+        results[friend_id] = {'friend_id': friend_id, 'success': False, 'error': error}
+
+    with transaction.atomic():
+        created = EventParticipant.objects.bulk_create(to_create)
+        created_ids = {participant.user_id for participant in created}
+        # bulk_create не вызывает сигналы: приглашенные видят мероприятие на карте
+        clustering.apply_point(created_ids, event.pk, clustering.map_point(event), 1)
+        notifications.notify_many(
+            created_ids,
+            notification_type='event_invitation',
+            title='Приглашение в мероприятие',
+            message=f'{inviter.username} пригласил вас в мероприятие "{event.title}"',
+            related_event=event,
+            related_user=inviter
+        )
+
+    for participant in created:
+        results[participant.user_id] = {
+            'friend_id': participant.user_id,
+            'success': True,
+            'participant': {
+                'id': participant.id,
+                'user_id': participant.user_id,
+                'username': friends[participant.user_id],
+                'role': participant.role,
+                'status': 'invited',
+                'status_display': 'Приглашен',
+                'invited_by': inviter.username
+            }
+        }
+    return [results[friend_id] for friend_id, _ in invites]
@@ -0,0 +1,122 @@
+# trips/ledger.py
+"""Личный баланс «кто кому должен» по всем мероприятиям.
+
+Каждая открытая доля (расход не погашен, доля не оплачена, должник не
+плательщик) - это долг должника плательщику. Сумма таких долгов по паре
+пользователей хранится в LedgerBalance и меняется в той же транзакции, что
+и расход или доля (сигналы в trips/signals.py, bulk-пути вызывают apply сами).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import ExpenseParticipant, LedgerBalance
+
+CENT = Decimal('0.01')
+
+
+def contribution(payer_id, debtor_id, amount):
+    """((меньший id, больший id), изменение amount) для долга debtor -> payer"""
+    if payer_id is None or debtor_id is None or payer_id == debtor_id or not amount:
+        return None
+    if payer_id < debtor_id:
+        return (payer_id, debtor_id), Decimal(amount)
+    return (debtor_id, payer_id), -Decimal(amount)
+
+
+def collect(rows, sign=1):
+    """{пара: изменение} из строк (плательщик, должник, сумма)"""
+    deltas = defaultdict(Decimal)
+    for payer_id, debtor_id, amount in rows:
+        item = contribution(payer_id, debtor_id, amount)
+        if item is not None:
+            deltas[item[0]] += sign * item[1]
+    return deltas
+
+
+def open_shares(**filters):
+    """(плательщик, должник, сумма) открытых долей, сгруппированные по паре"""
+    return ExpenseParticipant.objects.filter(
+        expense__is_settled=False,
+        is_paid=False,
+        **filters
+    ).exclude(user_id=F('expense__paid_by_id')).values_list(
+        'expense__paid_by_id', 'user_id'
+    ).annotate(total=Sum('share_amount')).order_by()
+
+
+def apply(deltas, create_missing=True):
+    """Прибавляем изменения к балансам пар; нулевые строки удаляем.
+
+    create_missing=False - для удаления долгов: строки пары, которой нет, не
+    создаем (при каскадном удалении пользователя его пары удаляются сами).
+    """
+    deltas = {pair: delta for pair, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    # Без отдельной точки сохранения: вызывается внутри транзакции расхода или доли
+    with transaction.atomic(savepoint=False):
+        user_ids = {user_id for user_id, _ in deltas}
+        other_ids = {other_id for _, other_id in deltas}
+        existing = {
+            (row.user_id, row.other_id): row
+            for row in LedgerBalance.objects.select_for_update().filter(user_id__in=user_ids, other_id__in=other_ids)
+            if (row.user_id, row.other_id) in deltas
+        }
+
+        now = timezone.now()
+        to_create, to_update, to_delete = [], [], []
+        for (user_id, other_id), delta in deltas.items():
+            row = existing.get((user_id, other_id))
+            if row is None:
+                if create_missing:
+                    to_create.append(LedgerBalance(user_id=user_id, other_id=other_id, amount=delta))
+            elif row.amount + delta == 0:
+                to_delete.append(row.pk)
+            else:
+                row.amount += delta
+                row.updated_at = now
+                to_update.append(row)
+
+        LedgerBalance.objects.bulk_create(to_create)
+        LedgerBalance.objects.bulk_update(to_update, ['amount', 'updated_at'])
+        LedgerBalance.objects.filter(pk__in=to_delete).delete()
+
+
+def unpaid_shares(expense_id):
+    return list(ExpenseParticipant.objects.filter(expense_id=expense_id, is_paid=False).values_list(
+        'user_id', 'share_amount'
+    ))
+
+
+def apply_expense(expense_id, payer_id, sign, create_missing=True):
+    """Добавить (sign=1) или убрать (sign=-1) неоплаченные доли открытого расхода"""
+    rows = [(payer_id, user_id, amount) for user_id, amount in unpaid_shares(expense_id)]
+    apply(collect(rows, sign), create_missing=create_missing)
+
+
+def user_balances(user):
+    """Балансы пользователя со всеми: [(другой пользователь, сумма)], сумма > 0 - должны ему"""
+    rows = LedgerBalance.objects.filter(
+        Q(user=user) | Q(other=user)
+    ).exclude(amount=0).select_related('user', 'other')
+    result = []
+    for row in rows:
+        if row.user_id == user.id:
+            result.append((row.other, row.amount))
+        else:
+            result.append((row.user, -row.amount))
+    return sorted(result, key=lambda item: item[1], reverse=True)
+
+
+def expected_balances(chunk_size=2000):
+    """Балансы пар, пересчитанные с нуля по долям (потоково, без загрузки всех долей)"""
+    deltas = defaultdict(Decimal)
+    for payer_id, debtor_id, total in open_shares().iterator(chunk_size=chunk_size):
+        item = contribution(payer_id, debtor_id, total)
+        if item is not None:
+            deltas[item[0]] += item[1]
+    return {pair: amount.quantize(CENT) for pair, amount in deltas.items() if amount.quantize(CENT)}
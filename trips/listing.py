@@ -0,0 +1,78 @@
+# trips/listing.py
+"""Список «мои мероприятия»: один запрос + keyset-пагинация по (start_datetime, id)"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Event, EventParticipant
+
+# Статусы участия, при которых мероприятие попадает в список (все, кроме declined)
+VISIBLE_STATUSES = ['accepted', 'confirmed', 'invited']
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def user_events(user):
+    """Активные мероприятия, где пользователь организатор или участник.
+
+    Роль зрителя для страницы проставляет access.roles_for - одним запросом
+    на все мероприятия пользователя, а не подзапросом на каждую строку.
+    """
+    member_event_ids = EventParticipant.objects.filter(
+        user=user,
+        status__in=VISIBLE_STATUSES
+    ).values('event_id')
+
+    return Event.objects.filter(
+        Q(user=user) | Q(id__in=member_event_ids),
+        is_active=True
+    ).select_related('user')
+
+
+def encode_keyset(moment, pk):
+    """Курсор из пары (дата, id)"""
+    raw = f'{moment.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def encode_cursor(event):
+    return encode_keyset(event.start_datetime, event.id)
+
+
+def decode_cursor(cursor):
+    """(дата, id) из курсора. ValueError, если курсор поврежден"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        moment_value, pk = raw.rsplit('|', 1)
+        moment = parse_datetime(moment_value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('Неверный курсор')
+    if moment is None:
+        raise ValueError('Неверный курсор')
+    return moment, pk
+
+
+def paginate_keyset(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Страница по убыванию (start_datetime, id) и курсор следующей страницы.
+
+    В отличие от OFFSET, стоимость не растет с номером страницы.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    queryset = queryset.order_by('-start_datetime', '-id')
+    if cursor:
+        start_datetime, event_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(start_datetime__lt=start_datetime) |
+            Q(start_datetime=start_datetime, id__lt=event_id)
+        )
+
+    page = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1])
+    return page, next_cursor
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from trips import notifications
+
+
+class Command(BaseCommand):
+    help = 'Сворачивает старые непрочитанные уведомления в сводку (запускать периодически, например из cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=int(notifications.DIGEST_AFTER.total_seconds() // 3600),
+                            help='Сворачивать непрочитанные старше стольких часов')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Пользователей за одну транзакцию')
+
+    def handle(self, *args, **options):
+        users, rows = notifications.build_digests(
+            older_than=timedelta(hours=options['hours']),
+            chunk_size=options['chunk_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Сводки обновлены у {users} пользователей, свернуто уведомлений: {rows}'))
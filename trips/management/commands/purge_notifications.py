@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from trips import notifications
+
+
+class Command(BaseCommand):
+    help = 'Переносит прочитанные уведомления старше срока хранения в архив и удаляет их порциями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=notifications.RETENTION_DAYS,
+                            help='Срок хранения прочитанных уведомлений в днях')
+        parser.add_argument('--chunk-size', type=int, default=notifications.PURGE_CHUNK_SIZE)
+        parser.add_argument('--no-archive', action='store_true', help='Удалять без переноса в архив')
+
+    def handle(self, *args, **options):
+        total = notifications.archive_read(
+            older_than=timedelta(days=options['days']),
+            chunk_size=options['chunk_size'],
+            archive=not options['no_archive']
+        )
+        action = 'Удалено' if options['no_archive'] else 'Перенесено в архив'
+        self.stdout.write(self.style.SUCCESS(f'{action} уведомлений: {total}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from trips import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Полный пересчет списков «возможно, вы знакомы» по матрице дружбы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = suggestions.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Кандидатов записано: {total}'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from trips import ledger
+from trips.models import LedgerBalance
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает балансы между пользователями с нуля по долям расходов и сверяет с таблицей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--check', action='store_true', help='Только сверить, ничего не менять')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        expected = ledger.expected_balances(chunk_size=chunk_size)
+
+        to_update, to_delete = [], []
+        stored = LedgerBalance.objects.order_by('id').only('id', 'user_id', 'other_id', 'amount')
+        for row in stored.iterator(chunk_size=chunk_size):
+            amount = expected.pop((row.user_id, row.other_id), None)
+            if amount is None:
+                to_delete.append(row.pk)
+            elif amount != row.amount:
+                row.amount = amount
+                to_update.append(row)
+        # Оставшиеся в expected пары в таблице отсутствуют
+        to_create = [LedgerBalance(user_id=user_id, other_id=other_id, amount=amount)
+                     for (user_id, other_id), amount in expected.items()]
+
+        summary = f'лишних: {len(to_delete)}, расхождений: {len(to_update)}, недостающих: {len(to_create)}'
+        if options['check']:
+            self.stdout.write(f'[check] {summary}')
+            return
+
+        with transaction.atomic():
+            LedgerBalance.objects.filter(pk__in=to_delete).delete()
+            LedgerBalance.objects.bulk_update(to_update, ['amount'], batch_size=chunk_size)
+            LedgerBalance.objects.bulk_create(to_create, batch_size=chunk_size)
+        self.stdout.write(self.style.SUCCESS(f'Баланс пересчитан - {summary}'))
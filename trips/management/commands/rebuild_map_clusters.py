@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from trips import clustering
+
+
+class Command(BaseCommand):
+    help = 'Полный пересчет кластеров мероприятий на карте'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = clustering.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Кластеров пересчитано: {total}'))
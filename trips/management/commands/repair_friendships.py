@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from trips.models import FriendRequest, Friendship
+
+
+class Command(BaseCommand):
+    help = 'Создает недостающие дружбы по принятым заявкам (порциями)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не менять')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        accepted = FriendRequest.objects.filter(is_accepted=True).order_by('id')
+
+        last_id = 0
+        checked = created = confirmed = 0
+        while True:
+            chunk = list(accepted.filter(id__gt=last_id).values_list('id', 'from_user_id', 'to_user_id')[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            checked += len(chunk)
+
+            pairs = {Friendship.ordered_pair(from_user_id, to_user_id) for _, from_user_id, to_user_id in chunk}
+            low_ids = {user_id for user_id, _ in pairs}
+            existing = {
+                (friendship.user_id, friendship.friend_id): friendship
+                for friendship in Friendship.objects.filter(user_id__in=low_ids).only('id', 'user_id', 'friend_id', 'confirmed')
+                if (friendship.user_id, friendship.friend_id) in pairs
+            }
+
+            missing = [Friendship(user_id=user_id, friend_id=friend_id, confirmed=True)
+                       for user_id, friend_id in pairs if (user_id, friend_id) not in existing]
+            unconfirmed = [friendship.id for friendship in existing.values() if not friendship.confirmed]
+            created += len(missing)
+            confirmed += len(unconfirmed)
+
+            if options['dry_run']:
+                continue
+            with transaction.atomic():
+                Friendship.objects.bulk_create(missing, ignore_conflicts=True)
+                Friendship.objects.filter(id__in=unconfirmed).update(confirmed=True)
+
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Проверено заявок: {checked}, создано дружб: {created}, подтверждено: {confirmed}'
+        ))
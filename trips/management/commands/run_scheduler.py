@@ -0,0 +1,34 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from trips import reminders
+
+
+class Command(BaseCommand):
+    help = 'Планировщик напоминаний о сроках задач и начале мероприятий (долгоживущий процесс)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=30, help='Секунд между проверками')
+        parser.add_argument('--lookahead', type=int, default=int(reminders.LOOKAHEAD.total_seconds() // 60),
+                            help='На сколько минут вперед держать триггеры в памяти')
+        parser.add_argument('--once', action='store_true', help='Один проход и выход (для cron и отладки)')
+
+    def handle(self, *args, **options):
+        lookahead = timedelta(minutes=options['lookahead'])
+        if lookahead.total_seconds() < options['interval']:
+            # Иначе триггеры между проверками не попадут в окно вовремя
+            lookahead = timedelta(seconds=options['interval'])
+        scheduler = reminders.Scheduler(lookahead=lookahead)
+        self.stdout.write(f'Планировщик запущен: окно {lookahead}, проверка каждые {options["interval"]} с')
+
+        while True:
+            events_sent, tasks_sent = scheduler.tick()
+            if events_sent or tasks_sent:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Напоминания: мероприятий {events_sent}, задач {tasks_sent} (в очереди {len(scheduler)})'
+                ))
+            if options['once']:
+                return
+            time.sleep(options['interval'])
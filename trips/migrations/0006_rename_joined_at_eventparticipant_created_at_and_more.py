@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-01-20 11:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_merge_20260119_1813'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='eventparticipant',
+            old_name='joined_at',
+            new_name='created_at',
+        ),
+        migrations.AddField(
+            model_name='eventparticipant',
+            name='invited_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invited_participants', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='eventparticipant',
+            name='role',
+            field=models.CharField(blank=True, default='Участник', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='eventparticipant',
+            name='status',
+            field=models.CharField(choices=[('invited', 'Приглашен'), ('accepted', 'Принял'), ('declined', 'Отклонил'), ('confirmed', 'Подтвержден')], default='invited', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='eventparticipant',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participating_events', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
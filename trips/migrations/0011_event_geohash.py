@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+from trips import geo
+
+
+def fill_geohash(apps, schema_editor):
+    Event = apps.get_model('trips', 'Event')
+    events = Event.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    batch = []
+    for event in events.iterator(chunk_size=1000):
+        event.geohash = geo.encode(event.latitude, event.longitude)
+        batch.append(event)
+        if len(batch) >= 1000:
+            Event.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    Event.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0010_calendarfeedtoken_event_user_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, verbose_name='Геохеш'),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
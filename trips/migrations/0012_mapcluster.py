@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0011_event_geohash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precision', models.PositiveSmallIntegerField(verbose_name='Длина геохеша')),
+                ('cell', models.CharField(max_length=12, verbose_name='Ячейка')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('latitude_sum', models.FloatField(default=0)),
+                ('longitude_sum', models.FloatField(default=0)),
+                ('event_ids', models.JSONField(blank=True, default=list)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='map_clusters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Кластер на карте',
+                'verbose_name_plural': 'Кластеры на карте',
+                'unique_together': {('user', 'precision', 'cell')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+FTS_TABLE = 'trips_event_fts'
+
+PG_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(trips_event.title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(trips_event.address, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(trips_event.description, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"title, description, address, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, address) "
+            f"SELECT id, title, coalesce(description, ''), coalesce(address, '') FROM trips_event"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS event_search_idx ON trips_event USING GIN (({PG_VECTOR}))')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS event_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0013_geocodecache'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
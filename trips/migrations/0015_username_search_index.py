@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-18 17:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_username_index(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    UsernameIndex = apps.get_model('trips', 'UsernameIndex')
+    UsernameTrigram = apps.get_model('trips', 'UsernameTrigram')
+
+    last_id = 0
+    while True:
+        users = list(User.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'username')[:1000])
+        if not users:
+            break
+        last_id = users[-1][0]
+        indexes, trigrams = [], []
+        for user_id, username in users:
+            username = username.strip().lower()
+            indexes.append(UsernameIndex(user_id=user_id, username=username))
+            padded = f'  {username} '
+            trigrams += [UsernameTrigram(user_id=user_id, trigram=trigram)
+                         for trigram in {padded[i:i + 3] for i in range(len(padded) - 2)}]
+        UsernameIndex.objects.bulk_create(indexes)
+        UsernameTrigram.objects.bulk_create(trigrams)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('trips', '0014_event_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsernameIndex',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='username_index', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('username', models.CharField(db_index=True, max_length=150)),
+            ],
+            options={
+                'verbose_name': 'Индекс имени пользователя',
+                'verbose_name_plural': 'Индекс имен пользователей',
+            },
+        ),
+        migrations.CreateModel(
+            name='UsernameTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='username_trigrams', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('trigram', 'user')},
+            },
+        ),
+        migrations.RunPython(fill_username_index, migrations.RunPython.noop),
+    ]
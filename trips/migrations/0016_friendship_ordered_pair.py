@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 18:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def collapse_friendships(apps, schema_editor):
+    """Две строки на пару -> одна (меньший id, больший id)"""
+    Friendship = apps.get_model('trips', 'Friendship')
+
+    pairs = {}
+    for friendship in Friendship.objects.order_by('created_at', 'id').iterator(chunk_size=2000):
+        key = tuple(sorted((friendship.user_id, friendship.friend_id)))
+        kept = pairs.get(key)
+        if kept is None:
+            pairs[key] = [friendship.id, key, friendship.confirmed, []]
+        else:
+            kept[2] = kept[2] or friendship.confirmed
+            kept[3].append(friendship.id)
+
+    to_delete, to_update = [], []
+    for friendship_id, (user_id, friend_id), confirmed, duplicates in pairs.values():
+        to_delete += duplicates
+        to_update.append(Friendship(id=friendship_id, user_id=user_id, friend_id=friend_id, confirmed=confirmed))
+    for start in range(0, len(to_delete), 500):
+        Friendship.objects.filter(id__in=to_delete[start:start + 500]).delete()
+    Friendship.objects.bulk_update(to_update, ['user', 'friend', 'confirmed'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0015_username_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(collapse_friendships, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.CheckConstraint(condition=models.Q(('user__lt', models.F('friend'))), name='friendship_ordered_pair'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 21:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    Notification = apps.get_model('trips', 'Notification')
+    NotificationCounter = apps.get_model('trips', 'NotificationCounter')
+    counts = Notification.objects.filter(is_read=False).values('user_id').annotate(
+        unread=models.Count('id')
+    ).order_by('user_id').values_list('user_id', 'unread')
+    NotificationCounter.objects.bulk_create(
+        (NotificationCounter(user_id=user_id, unread_count=unread) for user_id, unread in counts.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('trips', '0017_friendsuggestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Счетчик уведомлений',
+                'verbose_name_plural': 'Счетчики уведомлений',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0019_notification_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('event_invitation', 'Приглашение в мероприятие'), ('friend_request', 'Заявка в друзья'), ('event_update', 'Изменение мероприятия'), ('expense_added', 'Новый расход'), ('task_assigned', 'Назначена задача'), ('digest', 'Сводка уведомлений')], max_length=20),
+        ),
+    ]
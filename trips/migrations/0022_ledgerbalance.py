@@ -0,0 +1,57 @@
+# Generated by Django 6.0 on 2026-10-18 23:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_ledger(apps, schema_editor):
+    ExpenseParticipant = apps.get_model('trips', 'ExpenseParticipant')
+    LedgerBalance = apps.get_model('trips', 'LedgerBalance')
+    totals = ExpenseParticipant.objects.filter(
+        expense__is_settled=False,
+        is_paid=False
+    ).exclude(user_id=models.F('expense__paid_by_id')).values_list(
+        'expense__paid_by_id', 'user_id'
+    ).annotate(total=models.Sum('share_amount')).order_by()
+
+    balances = {}
+    for payer_id, debtor_id, total in totals.iterator():
+        if payer_id < debtor_id:
+            pair, amount = (payer_id, debtor_id), total
+        else:
+            pair, amount = (debtor_id, payer_id), -total
+        balances[pair] = balances.get(pair, 0) + amount
+    LedgerBalance.objects.bulk_create(
+        (LedgerBalance(user_id=user_id, other_id=other_id, amount=amount)
+         for (user_id, other_id), amount in balances.items() if amount),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0021_notificationarchive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_balances_of', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_balances', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Баланс между пользователями',
+                'verbose_name_plural': 'Балансы между пользователями',
+                'constraints': [models.CheckConstraint(condition=models.Q(('user__lt', models.F('other'))), name='ledger_ordered_pair')],
+                'unique_together': {('user', 'other')},
+            },
+        ),
+        migrations.RunPython(fill_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 23:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+RANK_STEP = 1024
+
+
+def fill_rank(apps, schema_editor):
+    # Текущий порядок колонки (срок, затем новые сверху) -> ранги с шагом RANK_STEP
+    Task = apps.get_model('trips', 'Task')
+    tasks = list(Task.objects.order_by('event_id', 'status', 'due_date', '-created_at').only('id', 'event_id', 'status'))
+    column, position = None, 0
+    for task in tasks:
+        if (task.event_id, task.status) != column:
+            column, position = (task.event_id, task.status), 0
+        position += 1
+        task.rank = position * RANK_STEP
+    Task.objects.bulk_update(tasks, ['rank'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0022_ledgerbalance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='rank',
+            field=models.BigIntegerField(default=0, verbose_name='Порядок'),
+        ),
+        migrations.RunPython(fill_rank, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['event', 'status', 'rank'], name='task_board_idx'),
+        ),
+    ]
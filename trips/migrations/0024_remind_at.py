@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-19 00:30
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+from trips.recurrence import iter_occurrences
+
+EVENT_REMIND_BEFORE = timedelta(hours=1)
+TASK_REMIND_BEFORE = timedelta(days=1)
+
+
+def fill_remind_at(apps, schema_editor):
+    Event = apps.get_model('trips', 'Event')
+    Task = apps.get_model('trips', 'Task')
+    now = timezone.now()
+    Task.objects.filter(
+        status__in=['todo', 'in_progress'],
+        assigned_to__isnull=False,
+        due_date__gt=now + TASK_REMIND_BEFORE
+    ).update(remind_at=models.F('due_date') - TASK_REMIND_BEFORE)
+
+    active = Event.objects.filter(is_active=True)
+    active.filter(
+        recurrence_frequency='none',
+        start_datetime__gt=now + EVENT_REMIND_BEFORE
+    ).update(remind_at=models.F('start_datetime') - EVENT_REMIND_BEFORE)
+
+    # Серии: напоминание о ближайшем будущем вхождении
+    series = list(active.exclude(recurrence_frequency='none'))
+    for event in series:
+        event.is_recurring = True  # у исторической модели нет свойства
+        for start, _ in iter_occurrences(event, start=now + EVENT_REMIND_BEFORE):
+            if start > now + EVENT_REMIND_BEFORE:
+                event.remind_at = start - EVENT_REMIND_BEFORE
+                break
+    Event.objects.bulk_update(series, ['remind_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0023_task_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='remind_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Напоминание'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='remind_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Напоминание'),
+        ),
+        migrations.RunPython(fill_remind_at, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
 # trips/models.py - ЗАМЕНИ весь файл на этот код
 
+import secrets
+
 from django.db import models
 from django.contrib.auth.models import User
 
+from . import geo
+
 
 class Event(models.Model):
     EVENT_TYPES = [
@@ -19,6 +23,14 @@ class Event(models.Model):
         ('map', 'Точка на карте'),
     ]
 
+    RECURRENCE_CHOICES = [
+        ('none', 'Не повторяется'),
+        ('daily', 'Ежедневно'),
+        ('weekly', 'Еженедельно'),
+        ('monthly', 'Ежемесячно'),
+        ('yearly', 'Ежегодно'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Пользователь')
     title = models.CharField(max_length=200, verbose_name='Название')
     description = models.TextField(blank=True, verbose_name='Описание')
@@ -34,20 +46,52 @@ class Event(models.Model):
     online_link = models.URLField(blank=True, verbose_name='Онлайн-ссылка')
     latitude = models.FloatField(null=True, blank=True, verbose_name='Широта')
     longitude = models.FloatField(null=True, blank=True, verbose_name='Долгота')
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False,
+                               verbose_name='Геохеш')  # пересчитывается из координат в save()
+
+    # Повторение (в духе RRULE): серия хранится одной записью, вхождения разворачиваются при выдаче
+    recurrence_frequency = models.CharField(max_length=10, choices=RECURRENCE_CHOICES, default='none',
+                                            verbose_name='Повторение')
+    recurrence_interval = models.PositiveSmallIntegerField(default=1, verbose_name='Интервал повторения')
+    recurrence_until = models.DateField(null=True, blank=True, verbose_name='Повторять до')
+    recurrence_count = models.PositiveIntegerField(null=True, blank=True, verbose_name='Количество повторений')
+    recurrence_exceptions = models.JSONField(default=list, blank=True,
+                                             verbose_name='Исключенные даты')  # ['YYYY-MM-DD', ...]
 
     # Метаданные
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
     is_active = models.BooleanField(default=True, verbose_name='Активно')
+    # Когда напомнить о ближайшем вхождении (trips/reminders.py); None - не о чем
+    remind_at = models.DateTimeField(null=True, blank=True, db_index=True, editable=False,
+                                     verbose_name='Напоминание')
 
     class Meta:
         ordering = ['-start_datetime']
         verbose_name = 'Мероприятие'
         verbose_name_plural = 'Мероприятия'
+        indexes = [
+            # Выборка календаря: события пользователя в окне дат
+            models.Index(fields=['user', 'is_active', 'start_datetime'], name='event_user_active_start_idx'),
+            # Проверка изменений для подписки .ics: max(updated_at) по пользователю
+            models.Index(fields=['user', 'updated_at'], name='event_user_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.user.username})"
 
+    def save(self, *args, **kwargs):
+        # Поддерживаем геохеш в актуальном состоянии для поиска на карте
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        super().save(*args, **kwargs)
+
+    @property
+    def is_recurring(self):
+        return self.recurrence_frequency != 'none'
+
     def get_location_display(self):
         if self.location_type == 'address':
             return self.address
@@ -150,11 +194,19 @@ class Task(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_tasks')
     due_date = models.DateTimeField(null=True, blank=True, verbose_name='Срок выполнения')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='todo', verbose_name='Статус')
+    # Порядок карточки в колонке доски, с промежутками (см. trips/tasks.py)
+    rank = models.BigIntegerField(default=0, verbose_name='Порядок')
+    # Когда напомнить исполнителю о сроке (trips/reminders.py); None - не о чем
+    remind_at = models.DateTimeField(null=True, blank=True, db_index=True, editable=False,
+                                     verbose_name='Напоминание')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['due_date', '-created_at']
+        indexes = [
+            models.Index(fields=['event', 'status', 'rank'], name='task_board_idx'),
+        ]
         verbose_name = 'Задача'
         verbose_name_plural = 'Задачи'
 
@@ -163,6 +215,7 @@ class Task(models.Model):
 
 
 class Friendship(models.Model):
+    """Дружба - одна строка на пару: user всегда пользователь с меньшим id, friend - с большим"""
     user = models.ForeignKey(User, related_name='friends', on_delete=models.CASCADE)
     friend = models.ForeignKey(User, related_name='friends_of', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -171,10 +224,62 @@ class Friendship(models.Model):
     class Meta:
         unique_together = ('user', 'friend')
         ordering = ['-created_at']
+        constraints = [
+            models.CheckConstraint(condition=models.Q(user__lt=models.F('friend')), name='friendship_ordered_pair'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.friend.username}"
 
+    def save(self, *args, **kwargs):
+        if self.user_id > self.friend_id:
+            self.user_id, self.friend_id = self.friend_id, self.user_id
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def ordered_pair(user_a, user_b):
+        """(меньший id, больший id) для пары пользователей (объектов или id)"""
+        a, b = getattr(user_a, 'pk', user_a), getattr(user_b, 'pk', user_b)
+        return (a, b) if a < b else (b, a)
+
+    @staticmethod
+    def between(user_a, user_b):
+        """Условие на строку дружбы пары; работает и с OuterRef"""
+        return (models.Q(user=user_a, friend=user_b) | models.Q(user=user_b, friend=user_a)) & \
+            models.Q(confirmed=True)
+
+    @staticmethod
+    def friend_ids_q(user, field='id'):
+        """Условие «field - id друга user» без OR по join'ам: два подзапроса по индексам"""
+        friendships = Friendship.objects.filter(confirmed=True)
+        return (models.Q(**{f'{field}__in': friendships.filter(user=user).values('friend_id')}) |
+                models.Q(**{f'{field}__in': friendships.filter(friend=user).values('user_id')}))
+
+    @staticmethod
+    def friends_of(user):
+        return User.objects.filter(Friendship.friend_ids_q(user))
+
+    @staticmethod
+    def are_friends(user_a, user_b):
+        user_id, friend_id = Friendship.ordered_pair(user_a, user_b)
+        return Friendship.objects.filter(user_id=user_id, friend_id=friend_id, confirmed=True).exists()
+
+    @staticmethod
+    def befriend(user_a, user_b):
+        user_id, friend_id = Friendship.ordered_pair(user_a, user_b)
+        friendship, created = Friendship.objects.get_or_create(
+            user_id=user_id, friend_id=friend_id, defaults={'confirmed': True}
+        )
+        if not created and not friendship.confirmed:
+            friendship.confirmed = True
+            friendship.save(update_fields=['confirmed'])
+        return friendship, created
+
+    @staticmethod
+    def unfriend(user_a, user_b):
+        user_id, friend_id = Friendship.ordered_pair(user_a, user_b)
+        return Friendship.objects.filter(user_id=user_id, friend_id=friend_id).delete()[0] > 0
+
 
 class FriendRequest(models.Model):
     from_user = models.ForeignKey(User, related_name='sent_requests', on_delete=models.CASCADE)
@@ -196,6 +301,7 @@ class Notification(models.Model):
         ('event_update', 'Изменение мероприятия'),
         ('expense_added', 'Новый расход'),
         ('task_assigned', 'Назначена задача'),
+        ('digest', 'Сводка уведомлений'),
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
@@ -207,9 +313,17 @@ class Notification(models.Model):
                                      related_name='sent_notifications')
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Схлопнутые однотипные уведомления: сколько событий в строке и кто их вызвал
+    count = models.PositiveIntegerField(default=1)
+    actors = models.JSONField(default=list, blank=True)  # имена последних участников
+    summary = models.JSONField(default=dict, blank=True)  # для сводки: {тип: количество}
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Лента уведомлений: keyset-пагинация по (created_at, id) в обе стороны
+            models.Index(fields=['user', 'created_at', 'id'], name='notification_user_created_idx'),
+        ]
         verbose_name = 'Уведомление'
         verbose_name_plural = 'Уведомления'
 
@@ -217,5 +331,167 @@ class Notification(models.Model):
         return f"{self.user.username}: {self.title}"
 
     def mark_as_read(self):
+        if self.is_read:
+            return
         self.is_read = True
-        self.save()
\ No newline at end of file
+        # Счетчик уменьшаем, только если уведомление действительно было непрочитанным
+        if Notification.objects.filter(pk=self.pk, is_read=False).update(is_read=True):
+            from .notifications import change_unread, publish_unread_count
+            change_unread(self.user_id, -1)
+            publish_unread_count(self.user_id)
+
+
+class CalendarFeedToken(models.Model):
+    """Секретный токен подписки на календарь (.ics) для внешних клиентов"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='calendar_feed_token')
+    token = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Токен подписки на календарь'
+        verbose_name_plural = 'Токены подписки на календарь'
+
+    def __str__(self):
+        return f"{self.user.username}: календарь"
+
+    @staticmethod
+    def generate_token():
+        return secrets.token_urlsafe(32)
+
+    def regenerate(self):
+        self.token = self.generate_token()
+        self.save(update_fields=['token'])
+
+
+class MapCluster(models.Model):
+    """Предрассчитанный кластер мероприятий пользователя на карте: ячейка геохеша для уровня масштаба"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='map_clusters')
+    precision = models.PositiveSmallIntegerField(verbose_name='Длина геохеша')
+    cell = models.CharField(max_length=12, verbose_name='Ячейка')
+    count = models.PositiveIntegerField(default=0)
+    latitude_sum = models.FloatField(default=0)
+    longitude_sum = models.FloatField(default=0)
+    event_ids = models.JSONField(default=list, blank=True)  # несколько мероприятий-представителей
+
+    class Meta:
+        unique_together = ('user', 'precision', 'cell')
+        verbose_name = 'Кластер на карте'
+        verbose_name_plural = 'Кластеры на карте'
+
+    def __str__(self):
+        return f"{self.user_id}: {self.cell} ({self.count})"
+
+    @property
+    def centroid(self):
+        return self.latitude_sum / self.count, self.longitude_sum / self.count
+
+
+class GeocodeCache(models.Model):
+    """Кэш геокодирования: адрес <-> координаты"""
+    normalized_address = models.CharField(max_length=255, unique=True)
+    address = models.CharField(max_length=255, verbose_name='Адрес')
+    latitude = models.FloatField(verbose_name='Широта')
+    longitude = models.FloatField(verbose_name='Долгота')
+    coord_key = models.CharField(max_length=32, db_index=True)  # координаты, округленные до ~11 м
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Геокодированный адрес'
+        verbose_name_plural = 'Геокодированные адреса'
+
+    def __str__(self):
+        return f"{self.address} ({self.latitude}, {self.longitude})"
+
+
+class UsernameIndex(models.Model):
+    """Имя пользователя в нижнем регистре - для префиксного поиска по индексу"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='username_index')
+    username = models.CharField(max_length=150, db_index=True)
+
+    class Meta:
+        verbose_name = 'Индекс имени пользователя'
+        verbose_name_plural = 'Индекс имен пользователей'
+
+
+class UsernameTrigram(models.Model):
+    """Триграммы имени пользователя - для поиска с опечатками"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='username_trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ('trigram', 'user')
+
+
+class FriendSuggestion(models.Model):
+    """Кандидат «возможно, вы знакомы»: не друг пользователя, но друг его друзей"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='friend_suggestions')
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE, related_name='suggested_to')
+    mutual_count = models.PositiveIntegerField(default=0, verbose_name='Общих друзей')
+
+    class Meta:
+        unique_together = ('user', 'candidate')
+        indexes = [
+            models.Index(fields=['user', '-mutual_count'], name='suggestion_user_mutual_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.candidate_id} ({self.mutual_count})"
+
+
+class NotificationCounter(models.Model):
+    """Счетчик непрочитанных уведомлений пользователя - чтение по первичному ключу вместо COUNT"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True,
+                                related_name='notification_counter')
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Счетчик уведомлений'
+        verbose_name_plural = 'Счетчики уведомлений'
+
+
+class NotificationArchive(models.Model):
+    """Прочитанные уведомления старше срока хранения (команда purge_notifications).
+
+    Без внешнего ключа на мероприятие и без служебных полей - основная таблица
+    остается маленькой, а история не теряется.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    notification_type = models.CharField(max_length=20)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    event_id = models.IntegerField(null=True, blank=True)
+    count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='notif_archive_user_created_idx'),
+        ]
+        verbose_name = 'Архивное уведомление'
+        verbose_name_plural = 'Архив уведомлений'
+
+
+class LedgerBalance(models.Model):
+    """Сводный долг между двумя пользователями по всем мероприятиям.
+
+    Одна строка на пару (user - меньший id, other - больший). amount > 0: other
+    должен user, amount < 0: user должен other. Поддерживается сигналами расходов
+    и долей (trips/ledger.py), сверка - команда rebuild_ledger.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_balances')
+    other = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_balances_of')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'other')
+        constraints = [
+            models.CheckConstraint(condition=models.Q(user__lt=models.F('other')), name='ledger_ordered_pair'),
+        ]
+        verbose_name = 'Баланс между пользователями'
+        verbose_name_plural = 'Балансы между пользователями'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.other_id}: {self.amount}"
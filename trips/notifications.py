@@ -0,0 +1,404 @@
+# trips/notifications.py
+"""Уведомления: сериализация и доставка в открытые потоки (SSE)"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .listing import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_keyset
+from .models import Notification, NotificationArchive, NotificationCounter
+from .pubsub import broker
+
+# Период пустых комментариев в потоке, чтобы прокси не рвали соединение
+STREAM_HEARTBEAT = 25
+
+# Однотипные уведомления по одному мероприятию за это время схлопываются в одну строку
+COALESCE_WINDOW = timedelta(hours=1)
+ACTORS_LIMIT = 5
+
+# Непрочитанные старше этого сворачиваются в сводку (build_notification_digests)
+DIGEST_AFTER = timedelta(days=1)
+DIGEST_MIN_ITEMS = 2
+# Приглашения ждут ответа кнопками - их в сводку не сворачиваем
+DIGEST_KEEP_TYPES = ['event_invitation']
+
+# Прочитанные старше этого уезжают в архив (purge_notifications)
+RETENTION_DAYS = 90
+# Строк на одну транзакцию удаления: SQLite блокирует запись на время DELETE
+PURGE_CHUNK_SIZE = 500
+
+
+def user_channel(user_id):
+    return f'notifications:{user_id}'
+
+
+def serialize_notification(notification):
+    return {
+        'id': notification.id,
+        'type': notification.notification_type,
+        'type_display': notification.get_notification_type_display(),
+        'title': notification.title,
+        'message': notification.message,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.strftime('%d.%m.%Y %H:%M'),
+        'event_id': notification.related_event_id,
+        'event_title': notification.related_event.title if notification.related_event else None,
+        'from_user': notification.related_user.username if notification.related_user else None,
+        'from_user_id': notification.related_user_id,
+        'count': notification.count,
+        'actors': notification.actors,
+    }
+
+
+def merge_actors(actors, new_actors):
+    """Новые имена в начало, без повторов, не больше ACTORS_LIMIT"""
+    return list(dict.fromkeys(name for name in list(new_actors) + list(actors) if name))[:ACTORS_LIMIT]
+
+
+def user_notifications(user):
+    return Notification.objects.filter(user=user).select_related('related_event', 'related_user')
+
+
+def notifications_page(user, cursor=None, since=None, limit=DEFAULT_PAGE_SIZE):
+    """Страница уведомлений по убыванию (created_at, id) - индекс notification_user_created_idx.
+
+    cursor - продолжение вглубь истории (next_cursor предыдущей страницы);
+    since - только уведомления новее токена (для дозагрузки без полного списка).
+    Возвращает (уведомления, next_cursor, since, has_more); has_more - в режиме
+    since новых больше, чем limit, и стоит запросить еще раз с новым токеном.
+    Чтение ничего не помечает прочитанным.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    queryset = user_notifications(user)
+
+    if since:
+        created_at, notification_id = decode_cursor(since)
+        # Берем самые старые из новых, чтобы при has_more не было дыр
+        page = list(queryset.filter(
+            Q(created_at__gt=created_at) |
+            Q(created_at=created_at, id__gt=notification_id)
+        ).order_by('created_at', 'id')[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+        if page:
+            since = encode_keyset(page[-1].created_at, page[-1].id)
+        page.reverse()
+        return page, None, since, has_more
+
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, notification_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) |
+            Q(created_at=created_at, id__lt=notification_id)
+        )
+
+    page = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_keyset(page[-1].created_at, page[-1].id)
+    if not cursor:
+        since = encode_keyset(page[0].created_at, page[0].id) if page else None
+    return page, next_cursor, since, False
+
+
+def count_unread(user_id):
+    """Честный пересчет по таблице уведомлений"""
+    return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+def unread_count(user_id):
+    """Счетчик непрочитанных - одно чтение по первичному ключу"""
+    count = NotificationCounter.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first()
+    if count is None:
+        # Счетчика еще нет - заводим по таблице
+        count = set_unread(user_id, count_unread(user_id))
+    return count
+
+
+def set_unread(user_id, count):
+    NotificationCounter.objects.update_or_create(user_id=user_id, defaults={'unread_count': count})
+    return count
+
+
+def change_unread(user_id, delta):
+    """Атомарное изменение счетчика (UPDATE ... SET unread_count = unread_count + delta)"""
+    updated = NotificationCounter.objects.filter(user_id=user_id).update(
+        unread_count=Greatest(F('unread_count') + delta, 0)
+    )
+    if not updated:
+        # Первое изменение: таблица уже учитывает его, так что просто пересчитываем
+        try:
+            with transaction.atomic():
+                NotificationCounter.objects.create(user_id=user_id, unread_count=count_unread(user_id))
+        except IntegrityError:
+            change_unread(user_id, delta)
+
+
+def notify_many(users, notification_type, title, message, related_event=None, related_user=None, coalesce=True):
+    """Одно и то же уведомление списку получателей: одна вставка вместо одной на каждого.
+
+    users - пользователи или их id; повторы и None отбрасываются. Если у получателя
+    есть свежее (COALESCE_WINDOW) непрочитанное уведомление того же типа и с тем же
+    заголовком по тому же мероприятию, оно обновляется на месте: count + 1, актор в
+    начало списка. coalesce=False - всегда отдельная строка: для уведомлений, у
+    которых важен каждый текст (напоминания).
+    Счетчики непрочитанных меняются в той же транзакции. Сигналы post_save при
+    bulk_create не срабатывают, поэтому в потоки публикуем здесь же (после коммита).
+    Возвращает новые и обновленные уведомления.
+    """
+    user_ids = list(dict.fromkeys(
+        getattr(user, 'pk', user) for user in users if user is not None
+    ))
+    if not user_ids:
+        return []
+
+    now = timezone.now()
+    actor = related_user.username if related_user is not None else None
+    with transaction.atomic():
+        coalesced = {}
+        if coalesce and related_event is not None:
+            recent = Notification.objects.select_for_update(of=('self',)).filter(
+                user_id__in=user_ids,
+                notification_type=notification_type,
+                title=title,
+                related_event=related_event,
+                is_read=False,
+                created_at__gte=now - COALESCE_WINDOW
+            ).select_related('related_user').order_by('created_at', 'id')
+            for notification in recent:
+                coalesced[notification.user_id] = notification  # самое свежее на получателя
+
+        for notification in coalesced.values():
+            previous = notification.actors or [
+                notification.related_user.username if notification.related_user else None
+            ]
+            notification.count += 1
+            notification.actors = merge_actors(previous, [actor])
+            notification.message = message
+            notification.related_user = related_user
+            # Поднимаем наверх ленты - клиент с токеном since увидит обновление
+            notification.created_at = now
+        Notification.objects.bulk_update(
+            list(coalesced.values()), ['count', 'actors', 'message', 'related_user', 'created_at']
+        )
+
+        new_ids = [user_id for user_id in user_ids if user_id not in coalesced]
+        created = Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                notification_type=notification_type,
+                title=title,
+                message=message,
+                related_event=related_event,
+                related_user=related_user,
+                actors=[actor] if actor else [],
+            )
+            for user_id in new_ids
+        ])
+
+        # Обновленные строки уже были непрочитанными - счетчик растет только у новых
+        counted = set(NotificationCounter.objects.filter(user_id__in=new_ids).values_list('user_id', flat=True))
+        NotificationCounter.objects.filter(user_id__in=counted).update(unread_count=F('unread_count') + 1)
+        missing = [user_id for user_id in new_ids if user_id not in counted]
+        if missing:
+            # Счетчика еще нет: заводим по таблице, новые уведомления уже в ней
+            totals = dict(Notification.objects.filter(
+                user_id__in=missing, is_read=False
+            ).values('user_id').annotate(total=Count('id')).values_list('user_id', 'total'))
+            NotificationCounter.objects.bulk_create([
+                NotificationCounter(user_id=user_id, unread_count=totals.get(user_id, 0))
+                for user_id in missing
+            ], ignore_conflicts=True)
+
+    changed = created + list(coalesced.values())
+
+    def send():
+        for notification in changed:
+            publish_notification(notification)
+    transaction.on_commit(send)
+    return changed
+
+
+def digest_text(summary):
+    labels = dict(Notification.TYPE_CHOICES)
+    total = sum(summary.values())
+    parts = [f'{labels.get(notification_type, notification_type)}: {count}'
+             for notification_type, count in sorted(summary.items(), key=lambda item: -item[1])]
+    return f'Непрочитанных уведомлений: {total}', ', '.join(parts)
+
+
+def _roll_up(user_ids, cutoff):
+    """Сворачиваем старые непрочитанные пользователей в одну сводку на каждого"""
+    rolled_users, rolled_rows = set(), 0
+    with transaction.atomic():
+        rows = Notification.objects.select_for_update().filter(
+            Q(created_at__lt=cutoff) & ~Q(notification_type__in=DIGEST_KEEP_TYPES) |
+            Q(notification_type='digest'),
+            user_id__in=user_ids,
+            is_read=False
+        ).order_by('-created_at', '-id')
+        by_user = {}
+        for notification in rows:
+            by_user.setdefault(notification.user_id, []).append(notification)
+
+        to_create, to_update, to_delete, removed = [], [], [], {}
+        for user_id, user_rows in by_user.items():
+            digests = [n for n in user_rows if n.notification_type == 'digest']
+            items = [n for n in user_rows if n.notification_type != 'digest']
+            if not items or (not digests and len(items) < DIGEST_MIN_ITEMS):
+                continue
+
+            # Самая свежая сводка остается и вбирает в себя остальное
+            target = digests[0] if digests else Notification(user_id=user_id, notification_type='digest', count=0)
+            summary = dict(target.summary)
+            actors = list(target.actors)
+            for notification in digests[1:] + items:
+                if notification.notification_type == 'digest':
+                    for notification_type, count in notification.summary.items():
+                        summary[notification_type] = summary.get(notification_type, 0) + count
+                else:
+                    summary[notification.notification_type] = \
+                        summary.get(notification.notification_type, 0) + notification.count
+                actors = merge_actors(notification.actors, actors)  # строки идут от новых к старым
+                to_delete.append(notification.id)
+
+            target.summary = summary
+            target.actors = actors
+            target.count = sum(summary.values())
+            target.title, target.message = digest_text(summary)
+            if target.pk is None:
+                to_create.append(target)
+            else:
+                target.created_at = timezone.now()
+                to_update.append(target)
+            removed[user_id] = len(user_rows) - 1  # вместо всех строк остается одна сводка
+            rolled_users.add(user_id)
+            rolled_rows += len(items)
+
+        Notification.objects.bulk_create(to_create)
+        Notification.objects.bulk_update(to_update, ['summary', 'actors', 'count', 'title', 'message', 'created_at'])
+        Notification.objects.filter(id__in=to_delete).delete()
+
+        # Несколько строк стали одной: уменьшаем счетчики (пользователи сгруппированы по разнице)
+        by_delta = {}
+        for user_id, delta in removed.items():
+            if delta:
+                by_delta.setdefault(delta, []).append(user_id)
+        for delta, delta_user_ids in by_delta.items():
+            NotificationCounter.objects.filter(user_id__in=delta_user_ids).update(
+                unread_count=Greatest(F('unread_count') - delta, 0)
+            )
+        for user_id in rolled_users:
+            publish_unread_count(user_id)
+    return rolled_users, rolled_rows
+
+
+def build_digests(older_than=DIGEST_AFTER, chunk_size=500):
+    """Сводки для всех пользователей порциями. Возвращает (пользователей, свернуто уведомлений)"""
+    cutoff = timezone.now() - older_than
+    stale_user_ids = Notification.objects.filter(
+        is_read=False,
+        created_at__lt=cutoff
+    ).exclude(
+        notification_type__in=DIGEST_KEEP_TYPES + ['digest']
+    ).values_list('user_id', flat=True).distinct().order_by('user_id')
+
+    users = rows = 0
+    last_user_id = 0
+    while True:
+        chunk = list(stale_user_ids.filter(user_id__gt=last_user_id)[:chunk_size])
+        if not chunk:
+            break
+        last_user_id = chunk[-1]
+        rolled_users, rolled_rows = _roll_up(chunk, cutoff)
+        users += len(rolled_users)
+        rows += rolled_rows
+    return users, rows
+
+
+def publish_notification(notification):
+    """Новое уведомление - в потоки получателя. Без подписчиков в БД не ходим"""
+    channel = user_channel(notification.user_id)
+    if not broker.has_subscribers(channel):
+        return
+    broker.publish(channel, {
+        'event': 'notification',
+        'notification': serialize_notification(notification),
+        'unread_count': unread_count(notification.user_id),
+    })
+
+
+def publish_unread_count(user_id, count=None):
+    """Новый счетчик - в потоки пользователя (после коммита)"""
+    channel = user_channel(user_id)
+    if not broker.has_subscribers(channel):
+        return
+
+    def send():
+        broker.publish(channel, {
+            'event': 'unread_count',
+            'unread_count': unread_count(user_id) if count is None else count,
+        })
+    transaction.on_commit(send)
+
+
+def archive_read(older_than=timedelta(days=RETENTION_DAYS), chunk_size=PURGE_CHUNK_SIZE, archive=True):
+    """Прочитанные уведомления старше срока - в NotificationArchive и из основной таблицы.
+
+    Порции по id, каждая в своей короткой транзакции. Возвращает число перенесенных.
+    """
+    cutoff = timezone.now() - older_than
+    stale = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by('id').values(
+        'id', 'user_id', 'notification_type', 'title', 'message', 'related_event_id', 'count', 'created_at'
+    )
+
+    total = 0
+    last_id = 0
+    while True:
+        chunk = list(stale.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1]['id']
+        with transaction.atomic():
+            if archive:
+                NotificationArchive.objects.bulk_create([
+                    NotificationArchive(
+                        user_id=row['user_id'],
+                        notification_type=row['notification_type'],
+                        title=row['title'],
+                        message=row['message'],
+                        event_id=row['related_event_id'],
+                        count=row['count'],
+                        created_at=row['created_at'],
+                    )
+                    for row in chunk
+                ])
+            Notification.objects.filter(id__in=[row['id'] for row in chunk]).delete()
+        total += len(chunk)
+    return total
+
+
+def clear_user_notifications(user_id, chunk_size=PURGE_CHUNK_SIZE):
+    """Удаление всех уведомлений пользователя порциями вместо одного большого DELETE.
+
+    Уведомления, пришедшие во время очистки, остаются. Возвращает число удаленных.
+    """
+    max_id = Notification.objects.filter(user_id=user_id).aggregate(max_id=Max('id'))['max_id']
+    if max_id is None:
+        return 0
+
+    total = 0
+    while True:
+        ids = list(Notification.objects.filter(user_id=user_id, id__lte=max_id).values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            total += Notification.objects.filter(id__in=ids).delete()[0]
+
+    count = set_unread(user_id, count_unread(user_id))
+    publish_unread_count(user_id, count)
+    return total
@@ -0,0 +1,72 @@
+# trips/pubsub.py
+"""Внутрипроцессный pub/sub для потоков уведомлений (SSE).
+
+Подписчики - асинхронные потоки в event loop ASGI-сервера; публиковать можно
+из любого потока (синхронные view, сигналы). Доставка только внутри процесса:
+каждый воркер обслуживает свои соединения. Уведомления из других процессов
+(run_scheduler, рассылка дайджестов, соседние воркеры) сюда не попадают -
+счетчик с ними клиент получает при переподключении потока (сервер шлет его
+первым событием), а пока поток недоступен - опросом (templates/base.html).
+"""
+import asyncio
+import threading
+
+# Сколько непрочитанных сообщений держим на одно соединение
+QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, channel, loop):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def _put(self, message):
+        if self.queue.full():
+            # Медленный клиент: старое сообщение теряем, счетчик придет в следующем
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Следующее сообщение или None по таймауту"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Вызывается из работающего event loop"""
+        subscription = Subscription(channel, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def has_subscribers(self, channel):
+        return channel in self._subscribers
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            if subscription.loop.is_closed():
+                self.unsubscribe(subscription)
+                continue
+            subscription.loop.call_soon_threadsafe(subscription._put, message)
+        return len(subscribers)
+
+
+broker = LocalBroker()
@@ -0,0 +1,117 @@
+# trips/recurrence.py
+"""Повторяющиеся мероприятия: ленивое развертывание серии в вхождения"""
+import calendar
+from datetime import timedelta
+
+from django.utils import timezone
+
+# Без явного конца окна бесконечные серии разворачиваем не дальше этого горизонта
+RECURRENCE_HORIZON = timedelta(days=365)
+
+FIXED_STEPS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+}
+
+MONTH_STEPS = {
+    'monthly': 1,
+    'yearly': 12,
+}
+
+
+def _local_naive(value):
+    """Локальное «настенное» время без tzinfo, чтобы шаг серии не съезжал при переходе на летнее время"""
+    return timezone.make_naive(value) if timezone.is_aware(value) else value
+
+
+def _add_months(value, months):
+    """Сдвиг на N месяцев. None, если такого дня в месяце нет (31-е число, 29 февраля)"""
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    if value.day > calendar.monthrange(year, month)[1]:
+        return None
+    return value.replace(year=year, month=month)
+
+
+def _iter_series(event, skip_to=None):
+    """Начала вхождений серии (локальное время) вместе с порядковым номером вхождения.
+
+    skip_to позволяет перескочить сразу к нужному участку серии, не перебирая
+    вхождения с самого начала.
+    """
+    first = _local_naive(event.start_datetime)
+    interval = max(event.recurrence_interval or 1, 1)
+    frequency = event.recurrence_frequency
+
+    if frequency in FIXED_STEPS:
+        step = FIXED_STEPS[frequency] * interval
+        number = 0
+        if skip_to is not None and skip_to > first:
+            number = (skip_to - first) // step
+        while True:
+            yield number, first + step * number
+            number += 1
+
+    months = MONTH_STEPS[frequency] * interval
+    step_number = 0
+    # С COUNT перескакивать нельзя: несуществующие даты не считаются вхождениями
+    if skip_to is not None and skip_to > first and not event.recurrence_count:
+        months_between = (skip_to.year - first.year) * 12 + skip_to.month - first.month
+        step_number = max(months_between // months - 1, 0)
+    number = step_number
+    while True:
+        candidate = _add_months(first, months * step_number)
+        step_number += 1
+        if candidate is None:
+            continue
+        yield number, candidate
+        number += 1
+
+
+def iter_occurrences(event, start=None, end=None):
+    """Генератор вхождений (начало, конец) мероприятия, пересекающихся с окном [start, end).
+
+    Для обычного мероприятия это само мероприятие (если попадает в окно),
+    для серии вхождения вычисляются по правилу лениво и только внутри окна.
+    end=None для серии означает бесконечный генератор - ограничивает вызывающий.
+    """
+    duration = None
+    if event.end_datetime:
+        duration = event.end_datetime - event.start_datetime
+
+    if not event.is_recurring:
+        occurrence_end = event.end_datetime or event.start_datetime
+        if (end is None or event.start_datetime < end) and (start is None or occurrence_end >= start):
+            yield event.start_datetime, event.end_datetime
+        return
+
+    exceptions = set(event.recurrence_exceptions or [])
+    skip_to = None
+    if start is not None:
+        # Вхождение, начавшееся раньше окна, может еще длиться внутри него
+        skip_to = _local_naive(start - duration if duration else start)
+
+    for number, local_start in _iter_series(event, skip_to):
+        if event.recurrence_count and number >= event.recurrence_count:
+            return
+        if event.recurrence_until and local_start.date() > event.recurrence_until:
+            return
+
+        occurrence_start = timezone.make_aware(local_start) if timezone.is_aware(event.start_datetime) else local_start
+        if end is not None and occurrence_start >= end:
+            return
+        if local_start.date().isoformat() in exceptions:
+            continue
+
+        occurrence_end = occurrence_start + duration if duration else None
+        if start is not None and (occurrence_end or occurrence_start) < start:
+            continue
+        yield occurrence_start, occurrence_end
+
+
+def expand_events(events, start=None, end=None):
+    """Разворачивает мероприятия окна в плоский список (мероприятие, начало, конец)"""
+    horizon = end or timezone.now() + RECURRENCE_HORIZON
+    for event in events:
+        for occurrence_start, occurrence_end in iter_occurrences(event, start, horizon if event.is_recurring else end):
+            yield event, occurrence_start, occurrence_end
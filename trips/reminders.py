@@ -0,0 +1,197 @@
+# trips/reminders.py
+"""Напоминания о сроках задач и скором начале мероприятий.
+
+Момент срабатывания хранится в remind_at (индекс) у задачи и мероприятия и
+пересчитывается сигналами при сохранении. Планировщик (run_scheduler) держит
+в памяти кучу триггеров только из окна [сейчас, сейчас + LOOKAHEAD): окно
+сдвигается диапазонными запросами по индексу, а изменения внутри уже
+загруженного окна подтягиваются по updated_at. Полных просмотров таблиц нет.
+Перед отправкой состояние строк перечитывается, поэтому устаревшие записи
+кучи безопасны: они просто пропускаются.
+"""
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import notifications
+from .models import Event, EventParticipant, Task
+from .recurrence import iter_occurrences
+
+EVENT_REMIND_BEFORE = timedelta(hours=1)
+TASK_REMIND_BEFORE = timedelta(days=1)
+OPEN_TASK_STATUSES = ['todo', 'in_progress']
+
+# Насколько вперед держим триггеры в памяти
+LOOKAHEAD = timedelta(minutes=15)
+# Запас при выборке изменений: строка могла закоммититься позже своего updated_at
+SYNC_OVERLAP = timedelta(minutes=1)
+TITLES_IN_MESSAGE = 5
+
+SOURCES = {
+    'event': Event,
+    'task': Task,
+}
+
+
+def event_remind_at(event, after):
+    """Когда напомнить о ближайшем вхождении, начинающемся позже after. None - не о чем"""
+    if not event.is_active:
+        return None
+    for start, _ in iter_occurrences(event, start=after):
+        # Вхождение, которое уже идет, тоже попадает в окно - его пропускаем
+        if start > after:
+            return start - EVENT_REMIND_BEFORE
+    return None
+
+
+def task_remind_at(task):
+    if task.due_date is None or task.assigned_to_id is None or task.status not in OPEN_TASK_STATUSES:
+        return None
+    return task.due_date - TASK_REMIND_BEFORE
+
+
+def _format_moment(value):
+    return timezone.localtime(value).strftime('%d.%m.%Y в %H:%M')
+
+
+def fire_events(event_ids, now):
+    """Напоминания участникам мероприятий. Возвращает (отправлено, [(id, следующее remind_at)])"""
+    with transaction.atomic():
+        events = list(Event.objects.select_for_update().filter(id__in=event_ids, remind_at__lte=now))
+        members = defaultdict(set)
+        for event in events:
+            members[event.id].add(event.user_id)
+        participants = EventParticipant.objects.filter(
+            event_id__in=[event.id for event in events],
+            status__in=['accepted', 'confirmed']
+        ).values_list('event_id', 'user_id')
+        for event_id, user_id in participants:
+            members[event_id].add(user_id)
+
+        sent = 0
+        for event in events:
+            start = event.remind_at + EVENT_REMIND_BEFORE
+            # Планировщик мог стоять: о начавшемся мероприятии уже не напоминаем
+            if start > now:
+                notifications.notify_many(
+                    members[event.id],
+                    notification_type='event_update',
+                    title='Скоро мероприятие',
+                    message=f'"{event.title}" начнется {_format_moment(start)}',
+                    related_event=event,
+                    coalesce=False
+                )
+                sent += 1
+            # У серии переходим к следующему вхождению
+            event.remind_at = event_remind_at(event, start)
+        Event.objects.bulk_update(events, ['remind_at'])
+    return sent, [(event.id, event.remind_at) for event in events if event.remind_at is not None]
+
+
+def fire_tasks(task_ids, now):
+    """Напоминания исполнителям: одно уведомление на исполнителя и мероприятие. Возвращает число уведомлений"""
+    with transaction.atomic():
+        tasks = list(Task.objects.select_for_update(of=('self',)).filter(
+            id__in=task_ids,
+            remind_at__lte=now
+        ).select_related('event').order_by('due_date', 'id'))
+        groups = defaultdict(list)
+        for task in tasks:
+            if task_remind_at(task) is not None and task.due_date > now:
+                groups[(task.event, task.assigned_to_id)].append(task)
+
+        for (event, user_id), items in groups.items():
+            if len(items) == 1:
+                message = f'Срок задачи "{items[0].title}" ({event.title}) - {_format_moment(items[0].due_date)}'
+            else:
+                titles = ', '.join(f'"{task.title}"' for task in items[:TITLES_IN_MESSAGE])
+                rest = len(items) - TITLES_IN_MESSAGE
+                message = f'Скоро срок задач в "{event.title}": {titles}' + (f' и еще {rest}' if rest > 0 else '')
+            notifications.notify_many(
+                [user_id],
+                notification_type='task_assigned',
+                title='Скоро срок задачи',
+                message=message,
+                related_event=event,
+                coalesce=False
+            )
+        Task.objects.filter(id__in=[task.id for task in tasks]).update(remind_at=None)
+    return len(groups)
+
+
+class Scheduler:
+    """Куча ближайших триггеров (remind_at, вид, id) в пределах окна LOOKAHEAD"""
+
+    def __init__(self, lookahead=LOOKAHEAD):
+        self.lookahead = lookahead
+        self.heap = []
+        # (вид, id) -> remind_at; запись кучи с другим временем устарела
+        self.scheduled = {}
+        self.loaded_until = None
+        self.synced_at = None
+
+    def __len__(self):
+        return len(self.scheduled)
+
+    def push(self, kind, pk, at):
+        if self.scheduled.get((kind, pk)) == at:
+            return
+        self.scheduled[(kind, pk)] = at
+        heapq.heappush(self.heap, (at, kind, pk))
+
+    def load(self, now):
+        """Сдвигаем окно: подгружаем триггеры из [loaded_until, now + lookahead)"""
+        horizon = now + self.lookahead
+        for kind, model in SOURCES.items():
+            rows = model.objects.filter(remind_at__lt=horizon)
+            if self.loaded_until is not None:
+                rows = rows.filter(remind_at__gte=self.loaded_until)
+            for pk, at in rows.values_list('id', 'remind_at').order_by().iterator(chunk_size=2000):
+                self.push(kind, pk, at)
+        self.loaded_until = horizon
+
+    def sync(self, now):
+        """Строки, измененные после прошлой синхронизации, с remind_at внутри загруженного окна"""
+        for kind, model in SOURCES.items():
+            rows = model.objects.filter(
+                remind_at__lt=self.loaded_until,
+                updated_at__gte=self.synced_at - SYNC_OVERLAP
+            ).values_list('id', 'remind_at').order_by()
+            for pk, at in rows:
+                self.push(kind, pk, at)
+        self.synced_at = now
+
+    def pop_due(self, now):
+        """{вид: [id]} сработавших триггеров; устаревшие записи кучи отбрасываются"""
+        due = defaultdict(list)
+        while self.heap and self.heap[0][0] <= now:
+            at, kind, pk = heapq.heappop(self.heap)
+            if self.scheduled.get((kind, pk)) != at:
+                continue
+            del self.scheduled[(kind, pk)]
+            due[kind].append(pk)
+        return due
+
+    def tick(self, now=None):
+        """Один шаг цикла: синхронизация, сдвиг окна, отправка. Возвращает (мероприятий, задач)"""
+        now = now or timezone.now()
+        if self.loaded_until is None:
+            self.load(now)
+            self.synced_at = now
+        else:
+            self.sync(now)
+            self.load(now)
+
+        due = self.pop_due(now)
+        events_sent, tasks_sent = 0, 0
+        if due['event']:
+            events_sent, rescheduled = fire_events(due['event'], now)
+            for pk, at in rescheduled:
+                if at < self.loaded_until:
+                    self.push('event', pk, at)
+        if due['task']:
+            tasks_sent = fire_tasks(due['task'], now)
+        return events_sent, tasks_sent
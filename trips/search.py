@@ -0,0 +1,102 @@
+# trips/search.py
+"""Полнотекстовый поиск мероприятий по названию, описанию и адресу.
+
+SQLite: виртуальная таблица FTS5 trips_event_fts (rowid = id мероприятия),
+синхронизируется сигналами при сохранении и удалении мероприятия.
+PostgreSQL: GIN-индекс по выражению tsvector прямо на trips_event, синхронизация не нужна.
+Остальные бэкенды: обычный icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'trips_event_fts'
+
+# Вес полей в ранжировании: название важнее адреса, адрес важнее описания
+SQLITE_RANK = f'bm25({FTS_TABLE}, 10.0, 1.0, 4.0)'
+
+PG_CONFIG = 'russian'
+PG_VECTOR = (
+    f"setweight(to_tsvector('{PG_CONFIG}', coalesce(trips_event.title, '')), 'A') || "
+    f"setweight(to_tsvector('{PG_CONFIG}', coalesce(trips_event.address, '')), 'B') || "
+    f"setweight(to_tsvector('{PG_CONFIG}', coalesce(trips_event.description, '')), 'C')"
+)
+
+MAX_QUERY_TERMS = 10
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def fts_query(text):
+    """Запрос FTS5 из пользовательского ввода: каждое слово - префиксный терм, все обязательны"""
+    terms = re.findall(r'\w+', text.lower())[:MAX_QUERY_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def index_event(event):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [event.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, address) VALUES (%s, %s, %s, %s)',
+            [event.pk, event.title, event.description or '', event.address or '']
+        )
+
+
+def unindex_event(event_id):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [event_id])
+
+
+def filter_matching(queryset, text):
+    """Мероприятия queryset, подходящие под запрос (условие по индексу, без ранжирования)"""
+    if connection.vendor == 'sqlite':
+        query = fts_query(text)
+        if not query:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [query]
+        ))
+    if connection.vendor == 'postgresql':
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT id FROM trips_event WHERE {PG_VECTOR} @@ websearch_to_tsquery('{PG_CONFIG}', %s)", [text]
+        ))
+    return queryset.filter(
+        Q(title__icontains=text) | Q(description__icontains=text) | Q(address__icontains=text)
+    )
+
+
+def rank_expression(text):
+    """Релевантность: чем меньше, тем выше в выдаче.
+
+    SQLite: bm25 доступен только внутри MATCH, поэтому ранги всех совпадений
+    считаются одним проходом в MATERIALIZED CTE - SQLite строит ее один раз на
+    запрос (не на строку) и ищет в ней по автоматическому индексу по rowid.
+    """
+    if connection.vendor == 'sqlite':
+        return RawSQL(
+            f'WITH matched AS MATERIALIZED ('
+            f'SELECT rowid AS event_id, {SQLITE_RANK} AS value FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+            f') SELECT value FROM matched WHERE event_id = trips_event.id',
+            [fts_query(text)]
+        )
+    if connection.vendor == 'postgresql':
+        return RawSQL(f"-ts_rank({PG_VECTOR}, websearch_to_tsquery('{PG_CONFIG}', %s))", [text])
+    return RawSQL('0', [])
+
+
+def search_events(queryset, text, page=1, page_size=20):
+    """Страница найденных мероприятий по релевантности и признак следующей страницы"""
+    offset = (page - 1) * page_size
+    results = filter_matching(queryset, text).annotate(
+        search_rank=rank_expression(text)
+    ).order_by('search_rank', '-start_datetime', '-id')
+    events = list(results[offset:offset + page_size + 1])
+    return events[:page_size], len(events) > page_size
@@ -0,0 +1,93 @@
+# trips/settlement.py
+"""Взаиморасчеты по мероприятию: балансы участников и минимальный набор переводов.
+
+Баланс считается агрегацией в БД по долям (ExpenseParticipant) непогашенных
+расходов: плательщику +доля, должнику -доля; оплаченные доли не учитываются.
+Переводы - жадное упрощение долгов: самый большой должник платит самому
+большому кредитору (две кучи по модулю суммы). Результат кэшируется на
+мероприятие и сбрасывается сигналами при изменении расходов и долей.
+"""
+import heapq
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .models import ExpenseParticipant
+
+CACHE_TIMEOUT = 60 * 60
+CENT = Decimal('0.01')
+
+
+def cache_key(event_id):
+    return f'event_settlement:{event_id}'
+
+
+def invalidate(*event_ids):
+    cache.delete_many([cache_key(event_id) for event_id in event_ids])
+
+
+def balances(event_id):
+    """{user_id: Decimal} - плюс: должны ему, минус: должен он. Нули отброшены"""
+    open_shares = ExpenseParticipant.objects.filter(
+        expense__event_id=event_id,
+        expense__is_settled=False,
+        is_paid=False
+    )
+    result = {}
+    credits = open_shares.values('expense__paid_by_id').annotate(total=Sum('share_amount')).order_by()
+    for row in credits:
+        result[row['expense__paid_by_id']] = row['total']
+    debits = open_shares.values('user_id').annotate(total=Sum('share_amount')).order_by()
+    for row in debits:
+        result[row['user_id']] = result.get(row['user_id'], Decimal('0')) - row['total']
+    return {user_id: amount.quantize(CENT) for user_id, amount in result.items() if amount.quantize(CENT)}
+
+
+def simplify(balances):
+    """Минимальный по числу переводов (жадно) список (должник, кредитор, сумма)"""
+    # heapq - куча минимумов, поэтому храним суммы со знаком минус
+    creditors = [(-amount, user_id) for user_id, amount in balances.items() if amount > 0]
+    debtors = [(amount, user_id) for user_id, amount in balances.items() if amount < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor_id = heapq.heappop(creditors)
+        debt, debtor_id = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor_id, creditor_id, amount))
+        # Остаток возвращаем в кучу
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor_id))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor_id))
+    return transfers
+
+
+def settle_up(event_id):
+    """Балансы и переводы мероприятия (из кэша)"""
+    key = cache_key(event_id)
+    result = cache.get(key)
+    if result is None:
+        event_balances = balances(event_id)
+        transfers = simplify(event_balances)
+        usernames = dict(User.objects.filter(id__in=event_balances).values_list('id', 'username'))
+        result = {
+            'balances': [{
+                'user_id': user_id,
+                'username': usernames.get(user_id),
+                'balance': amount,
+            } for user_id, amount in sorted(event_balances.items(), key=lambda item: item[1], reverse=True)],
+            'transfers': [{
+                'from_user_id': debtor_id,
+                'from_username': usernames.get(debtor_id),
+                'to_user_id': creditor_id,
+                'to_username': usernames.get(creditor_id),
+                'amount': amount,
+            } for debtor_id, creditor_id, amount in transfers],
+        }
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,287 @@
+# trips/signals.py
+"""Сигналы моделей: поддержание предрассчитанных данных в актуальном состоянии"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import clustering, ledger, notifications, reminders, search, settlement, suggestions, user_search
+from .listing import VISIBLE_STATUSES
+from .models import Event, EventParticipant, Expense, ExpenseParticipant, FriendRequest, Friendship, Notification, Task
+
+
+# ===== КЛАСТЕРЫ НА КАРТЕ =====
+
+@receiver(pre_save, sender=Event)
+def remember_event_map_point(sender, instance, raw=False, **kwargs):
+    """Запоминаем, где мероприятие было на карте до сохранения"""
+    instance._old_map_point = None
+    if raw or instance.pk is None:
+        return
+    old = Event.objects.filter(pk=instance.pk).only(
+        'is_active', 'geohash', 'latitude', 'longitude'
+    ).first()
+    if old is not None:
+        instance._old_map_point = clustering.map_point(old)
+
+
+@receiver(post_save, sender=Event)
+def update_event_map_clusters(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old_point = getattr(instance, '_old_map_point', None)
+    new_point = clustering.map_point(instance)
+    if old_point == new_point:
+        return
+    # У нового мероприятия участников еще нет
+    user_ids = {instance.user_id} if created else clustering.member_ids(instance)
+    clustering.move_point(user_ids, instance.pk, old_point, new_point)
+
+
+@receiver(pre_delete, sender=Event)
+def remove_event_map_point(sender, instance, **kwargs):
+    # Участники убираются из кластеров своим post_delete при каскадном удалении
+    clustering.apply_point({instance.user_id}, instance.pk, clustering.map_point(instance), -1)
+
+
+@receiver(pre_save, sender=EventParticipant)
+def remember_participant_status(sender, instance, raw=False, **kwargs):
+    instance._old_status = None
+    if not raw and instance.pk is not None:
+        instance._old_status = EventParticipant.objects.filter(pk=instance.pk).values_list(
+            'status', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=EventParticipant)
+def update_participant_map_clusters(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    was_visible = getattr(instance, '_old_status', None) in VISIBLE_STATUSES
+    is_visible = instance.status in VISIBLE_STATUSES
+    if was_visible == is_visible or instance.user_id == instance.event.user_id:
+        return
+    point = clustering.map_point(instance.event)
+    clustering.apply_point({instance.user_id}, instance.event_id, point, 1 if is_visible else -1)
+
+
+@receiver(post_delete, sender=EventParticipant)
+def remove_participant_map_point(sender, instance, **kwargs):
+    if instance.status not in VISIBLE_STATUSES:
+        return
+    event = Event.objects.filter(pk=instance.event_id).first()
+    if event is not None and event.user_id != instance.user_id:
+        clustering.apply_point({instance.user_id}, event.pk, clustering.map_point(event), -1)
+
+
+# ===== ПОИСКОВЫЙ ИНДЕКС =====
+
+SEARCH_FIELDS = {'title', 'description', 'address'}
+
+
+@receiver(post_save, sender=Event)
+def update_event_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    search.index_event(instance)
+
+
+@receiver(post_delete, sender=Event)
+def remove_event_search_index(sender, instance, **kwargs):
+    search.unindex_event(instance.pk)
+
+
+# ===== ИНДЕКС ИМЕН ПОЛЬЗОВАТЕЛЕЙ =====
+
+@receiver(post_save, sender=User)
+def update_username_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login - индекс трогать незачем
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    user_search.index_user(instance)
+
+
+# ===== ВОЗМОЖНЫЕ ДРУЗЬЯ =====
+
+@receiver(post_save, sender=Friendship)
+def add_friend_suggestions(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or not instance.confirmed:
+        return
+    # Friendship.befriend подтверждает существующую строку через update_fields=['confirmed']
+    if created or (update_fields is not None and 'confirmed' in update_fields):
+        suggestions.on_friendship_added(instance.user_id, instance.friend_id)
+
+
+@receiver(post_delete, sender=Friendship)
+def remove_friend_suggestions(sender, instance, origin=None, **kwargs):
+    if not instance.confirmed:
+        return
+    # При удалении пользователя не создаем кандидатов, которые тут же удалит каскад
+    deleting_user = isinstance(origin, User) or getattr(origin, 'model', None) is User
+    suggestions.on_friendship_removed(instance.user_id, instance.friend_id, restore_pair=not deleting_user)
+
+
+@receiver(post_save, sender=FriendRequest)
+@receiver(post_delete, sender=FriendRequest)
+def invalidate_friend_suggestions(sender, instance, **kwargs):
+    # Кандидаты с заявкой в любую сторону в топ не попадают
+    suggestions.invalidate(instance.from_user_id, instance.to_user_id)
+
+
+# ===== ПОТОК УВЕДОМЛЕНИЙ =====
+
+@receiver(post_save, sender=Notification)
+def push_notification(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        if not instance.is_read:
+            notifications.change_unread(instance.user_id, 1)
+        transaction.on_commit(lambda: notifications.publish_notification(instance))
+    else:
+        notifications.publish_unread_count(instance.user_id)
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_counter(sender, instance, origin=None, **kwargs):
+    if instance.is_read:
+        return
+    # Массовое удаление уведомлений (очистка) само обнуляет счетчик,
+    # а при удалении пользователя счетчик удаляется каскадом
+    if getattr(origin, 'model', None) is Notification or isinstance(origin, User) or \
+            getattr(origin, 'model', None) is User:
+        return
+    notifications.change_unread(instance.user_id, -1)
+    notifications.publish_unread_count(instance.user_id)
+
+
+# ===== ВЗАИМОРАСЧЕТЫ =====
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def invalidate_expense_settlement(sender, instance, **kwargs):
+    settlement.invalidate(instance.event_id)
+
+
+@receiver(post_save, sender=ExpenseParticipant)
+def invalidate_share_settlement(sender, instance, raw=False, **kwargs):
+    if not raw:
+        settlement.invalidate(instance.expense.event_id)
+
+
+@receiver(post_delete, sender=ExpenseParticipant)
+def invalidate_deleted_share_settlement(sender, instance, origin=None, **kwargs):
+    # При удалении расхода кэш сбросит сигнал самого расхода
+    if isinstance(origin, Expense) or getattr(origin, 'model', None) is Expense:
+        return
+    # Расход мог быть удален тем же каскадом (удаление мероприятия или пользователя)
+    event_id = Expense.objects.filter(pk=instance.expense_id).values_list('event_id', flat=True).first()
+    if event_id is not None:
+        settlement.invalidate(event_id)
+
+
+# ===== ЛИЧНЫЙ БАЛАНС ПО ВСЕМ МЕРОПРИЯТИЯМ =====
+
+def _is_cascade_from(origin, *models):
+    return isinstance(origin, models) or getattr(origin, 'model', None) in models
+
+
+@receiver(pre_save, sender=Expense)
+def remember_expense_state(sender, instance, raw=False, **kwargs):
+    instance._old_ledger_state = None
+    if not raw and instance.pk is not None:
+        instance._old_ledger_state = Expense.objects.filter(pk=instance.pk).values_list(
+            'paid_by_id', 'is_settled'
+        ).first()
+
+
+@receiver(post_save, sender=Expense)
+def update_ledger_for_expense(sender, instance, created=False, raw=False, **kwargs):
+    old_state = getattr(instance, '_old_ledger_state', None)
+    if raw or created or old_state is None:
+        return
+    old_payer_id, old_settled = old_state
+    if (old_payer_id, old_settled) == (instance.paid_by_id, instance.is_settled):
+        return
+    # Погашение, возобновление или смена плательщика: убираем долги по старому состоянию, добавляем по новому
+    shares = ledger.unpaid_shares(instance.pk)
+    rows = []
+    if not old_settled:
+        rows += [(old_payer_id, user_id, -amount) for user_id, amount in shares]
+    if not instance.is_settled:
+        rows += [(instance.paid_by_id, user_id, amount) for user_id, amount in shares]
+    ledger.apply(ledger.collect(rows))
+
+
+@receiver(pre_delete, sender=Expense)
+def remove_expense_from_ledger(sender, instance, **kwargs):
+    # Доли удаляются тем же каскадом - их сигнал пропускает удаление расхода
+    if not instance.is_settled:
+        ledger.apply_expense(instance.pk, instance.paid_by_id, -1, create_missing=False)
+
+
+@receiver(pre_save, sender=ExpenseParticipant)
+def remember_share_state(sender, instance, raw=False, **kwargs):
+    instance._old_ledger_share = None
+    if not raw and instance.pk is not None:
+        instance._old_ledger_share = ExpenseParticipant.objects.filter(pk=instance.pk).values_list(
+            'expense__paid_by_id', 'expense__is_settled', 'user_id', 'share_amount', 'is_paid'
+        ).first()
+
+
+@receiver(post_save, sender=ExpenseParticipant)
+def update_ledger_for_share(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rows = []
+    old = getattr(instance, '_old_ledger_share', None)
+    if old is not None:
+        old_payer_id, old_settled, old_user_id, old_amount, old_paid = old
+        if not old_settled and not old_paid:
+            rows.append((old_payer_id, old_user_id, -old_amount))
+    expense = instance.expense
+    if not expense.is_settled and not instance.is_paid:
+        rows.append((expense.paid_by_id, instance.user_id, instance.share_amount))
+    ledger.apply(ledger.collect(rows))
+
+
+@receiver(post_delete, sender=ExpenseParticipant)
+def remove_share_from_ledger(sender, instance, origin=None, **kwargs):
+    # Расход, мероприятие или пользователь: долги уже убраны в pre_delete расхода,
+    # а пары удаляемого пользователя удалит каскад
+    if instance.is_paid or _is_cascade_from(origin, Expense, Event, User):
+        return
+    expense = Expense.objects.filter(pk=instance.expense_id).values_list('paid_by_id', 'is_settled').first()
+    if expense is not None and not expense[1]:
+        ledger.apply(ledger.collect([(expense[0], instance.user_id, instance.share_amount)], -1),
+                     create_missing=False)
+
+
+# ===== НАПОМИНАНИЯ =====
+
+EVENT_SCHEDULE_FIELDS = ['start_datetime', 'is_active', 'recurrence_frequency', 'recurrence_interval',
+                         'recurrence_until', 'recurrence_count', 'recurrence_exceptions']
+TASK_SCHEDULE_FIELDS = ['due_date', 'status', 'assigned_to_id']
+
+
+def _schedule_changed(model, instance, fields):
+    if instance.pk is None:
+        return True
+    old = model.objects.filter(pk=instance.pk).values_list(*fields).first()
+    return old is None or old != tuple(getattr(instance, field) for field in fields)
+
+
+@receiver(pre_save, sender=Event)
+def schedule_event_reminder(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Если расписание не менялось, remind_at не трогаем - иначе отправленное напоминание повторится
+    if raw or update_fields is not None or not _schedule_changed(Event, instance, EVENT_SCHEDULE_FIELDS):
+        return
+    instance.remind_at = reminders.event_remind_at(instance, timezone.now())
+
+
+@receiver(pre_save, sender=Task)
+def schedule_task_reminder(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or update_fields is not None or not _schedule_changed(Task, instance, TASK_SCHEDULE_FIELDS):
+        return
+    instance.remind_at = reminders.task_remind_at(instance)
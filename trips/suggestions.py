@@ -0,0 +1,164 @@
+# trips/suggestions.py
+"""«Возможно, вы знакомы»: друзья друзей, ранжированные по числу общих друзей.
+
+Списки кандидатов (FriendSuggestion) хранятся для каждого пользователя и
+обновляются инкрементально при появлении и удалении дружбы (trips/signals.py).
+Страница друзей читает готовый топ из кэша. Полный пересчет - команда
+rebuild_friend_suggestions (разреженное произведение A·A матрицы смежности).
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import FriendRequest, FriendSuggestion, Friendship
+
+SUGGESTIONS_LIMIT = 10
+CACHE_TIMEOUT = 60 * 60
+
+
+def cache_key(user_id):
+    return f'friend_suggestions:{user_id}'
+
+
+def invalidate(*user_ids):
+    cache.delete_many([cache_key(user_id) for user_id in user_ids])
+
+
+def friend_id_set(user_id):
+    pairs = Friendship.objects.filter(
+        Q(user_id=user_id) | Q(friend_id=user_id), confirmed=True
+    ).values_list('user_id', 'friend_id')
+    return {friend_id if low_id == user_id else low_id for low_id, friend_id in pairs}
+
+
+def _adjust(center_id, other_ids, delta):
+    """mutual_count += delta для пар (center, other) и (other, center)"""
+    if not other_ids:
+        return
+    with transaction.atomic():
+        rows = {
+            (row.user_id, row.candidate_id): row
+            for row in FriendSuggestion.objects.select_for_update().filter(
+                Q(user_id=center_id, candidate_id__in=other_ids) |
+                Q(candidate_id=center_id, user_id__in=other_ids)
+            )
+        }
+        to_create, to_update, to_delete = [], [], []
+        for other_id in other_ids:
+            for pair in ((center_id, other_id), (other_id, center_id)):
+                row = rows.get(pair)
+                if row is None:
+                    if delta > 0:
+                        to_create.append(FriendSuggestion(user_id=pair[0], candidate_id=pair[1], mutual_count=delta))
+                elif row.mutual_count + delta <= 0:
+                    to_delete.append(row.pk)
+                else:
+                    row.mutual_count += delta
+                    to_update.append(row)
+
+        FriendSuggestion.objects.bulk_create(to_create, batch_size=500)
+        FriendSuggestion.objects.bulk_update(to_update, ['mutual_count'], batch_size=500)
+        FriendSuggestion.objects.filter(pk__in=to_delete).delete()
+
+
+def on_friendship_added(user_a_id, user_b_id):
+    friends_a = friend_id_set(user_a_id) - {user_b_id}
+    friends_b = friend_id_set(user_b_id) - {user_a_id}
+
+    with transaction.atomic():
+        # Теперь друзья - больше не кандидаты друг для друга
+        FriendSuggestion.objects.filter(
+            Q(user_id=user_a_id, candidate_id=user_b_id) | Q(user_id=user_b_id, candidate_id=user_a_id)
+        ).delete()
+        # Друзья A получают общего друга A с B (кроме тех, кто уже дружит с B), и наоборот
+        _adjust(user_b_id, friends_a - friends_b, 1)
+        _adjust(user_a_id, friends_b - friends_a, 1)
+
+    invalidate(user_a_id, user_b_id, *(friends_a ^ friends_b))
+
+
+def on_friendship_removed(user_a_id, user_b_id, restore_pair=True):
+    friends_a = friend_id_set(user_a_id) - {user_b_id}
+    friends_b = friend_id_set(user_b_id) - {user_a_id}
+
+    with transaction.atomic():
+        _adjust(user_b_id, friends_a - friends_b, -1)
+        _adjust(user_a_id, friends_b - friends_a, -1)
+        # Бывшие друзья с общими друзьями снова становятся кандидатами
+        mutual = len(friends_a & friends_b)
+        if restore_pair and mutual:
+            for user_id, candidate_id in ((user_a_id, user_b_id), (user_b_id, user_a_id)):
+                FriendSuggestion.objects.update_or_create(
+                    user_id=user_id, candidate_id=candidate_id, defaults={'mutual_count': mutual}
+                )
+
+    invalidate(user_a_id, user_b_id, *(friends_a ^ friends_b))
+
+
+def top_suggestions(user, limit=SUGGESTIONS_LIMIT):
+    """Топ кандидатов пользователя (без тех, с кем уже есть заявка) - из кэша"""
+    key = cache_key(user.id)
+    suggestions = cache.get(key)
+    if suggestions is None:
+        pending = FriendRequest.objects.filter(
+            Q(from_user=user, to_user=OuterRef('candidate_id')) |
+            Q(from_user=OuterRef('candidate_id'), to_user=user)
+        )
+        rows = FriendSuggestion.objects.filter(user=user).exclude(
+            Exists(pending)
+        ).select_related('candidate').order_by('-mutual_count', 'candidate_id')[:limit]
+        suggestions = [{
+            'id': row.candidate.id,
+            'username': row.candidate.username,
+            'email': row.candidate.email,
+            'mutual_count': row.mutual_count,
+        } for row in rows]
+        cache.set(key, suggestions, CACHE_TIMEOUT)
+    return suggestions
+
+
+def iter_adjacency(chunk_size=5000):
+    """Матрица смежности дружбы в виде списков соседей (строки разреженной матрицы)"""
+    adjacency = {}
+    friendships = Friendship.objects.filter(confirmed=True).values_list('user_id', 'friend_id')
+    for user_id, friend_id in friendships.iterator(chunk_size=chunk_size):
+        adjacency.setdefault(user_id, []).append(friend_id)
+        adjacency.setdefault(friend_id, []).append(user_id)
+    return adjacency
+
+
+def iter_mutual_counts(adjacency):
+    """Строки разреженного произведения A·A (алгоритм Густавсона) без диагонали и без уже друзей.
+
+    Для каждого пользователя (user, candidate, число общих друзей) - только ненулевые элементы.
+    """
+    for user_id, friends in adjacency.items():
+        row = Counter()
+        for friend_id in friends:
+            row.update(adjacency[friend_id])
+        row.pop(user_id, None)
+        for friend_id in friends:
+            row.pop(friend_id, None)
+        for candidate_id, mutual_count in row.items():
+            yield user_id, candidate_id, mutual_count
+
+
+def rebuild(batch_size=1000):
+    """Полный пересчет кандидатов. Возвращает число записей"""
+    adjacency = iter_adjacency()
+    total = 0
+    with transaction.atomic():
+        FriendSuggestion.objects.all().delete()
+        batch = []
+        for user_id, candidate_id, mutual_count in iter_mutual_counts(adjacency):
+            batch.append(FriendSuggestion(user_id=user_id, candidate_id=candidate_id, mutual_count=mutual_count))
+            if len(batch) >= batch_size:
+                FriendSuggestion.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        FriendSuggestion.objects.bulk_create(batch)
+        total += len(batch)
+    cache.delete_many([cache_key(user_id) for user_id in adjacency])
+    return total
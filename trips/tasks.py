@@ -0,0 +1,205 @@
+# trips/tasks.py
+"""Доска задач мероприятия: колонки по статусу, порядок карточек - разреженный rank.
+
+Ранги идут с шагом RANK_STEP, поэтому карточка, положенная между соседями,
+получает ранг посередине, и остальные строки не меняются. Если промежуток
+закончился, перенумеровывается только эта колонка. Все перемещения запроса
+применяются в памяти к колонкам, загруженным одним запросом, и сохраняются
+одним bulk_update.
+"""
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import reminders
+from .expenses import event_member_ids
+from .models import Task
+
+RANK_STEP = 1024
+MAX_BATCH_MOVES = 500
+STATUSES = [status for status, _ in Task.STATUS_CHOICES]
+
+
+def serialize_task(task):
+    """Карточка для доски; assigned_to и created_by должны быть подгружены select_related"""
+    return {
+        'id': task.id,
+        'title': task.title,
+        'description': task.description,
+        'status': task.status,
+        'rank': task.rank,
+        'assigned_to_id': task.assigned_to_id,
+        'assigned_to': task.assigned_to.username if task.assigned_to else None,
+        'created_by': task.created_by.username,
+        'due_date': task.due_date.isoformat() if task.due_date else None,
+    }
+
+
+def serialize_board(columns):
+    """Колонки доски для JSON в порядке STATUS_CHOICES"""
+    status_titles = dict(Task.STATUS_CHOICES)
+    return [{
+        'status': status,
+        'title': status_titles.get(status, status),
+        'tasks': [serialize_task(task) for task in column],
+    } for status, column in columns.items()]
+
+
+def board(event):
+    """{status: [Task, ...]} по всем статусам в порядке доски - одним запросом"""
+    columns = {status: [] for status in STATUSES}
+    tasks = Task.objects.filter(event=event).select_related('assigned_to', 'created_by').order_by('status', 'rank', 'id')
+    for task in tasks:
+        columns.setdefault(task.status, []).append(task)
+    return columns
+
+
+def next_rank(event, status):
+    """Ранг для новой карточки в конце колонки"""
+    last = Task.objects.filter(event=event, status=status).aggregate(last=Max('rank'))['last']
+    return (last or 0) + RANK_STEP
+
+
+def clean_task_data(event, data):
+    """Поля карточки из JSON: title, description, assigned_to_id, due_date. ValueError, если данные неверны"""
+    title = (data.get('title') or '').strip()
+    if not title:
+        raise ValueError('Укажите название задачи')
+
+    assigned_to_id = data.get('assigned_to_id')
+    if assigned_to_id:
+        assigned_to_id = int(assigned_to_id)
+        if assigned_to_id not in event_member_ids(event):
+            raise ValueError('Исполнитель должен быть участником мероприятия')
+
+    due_date = None
+    if data.get('due_date'):
+        due_date = parse_datetime(data['due_date'])
+        if due_date is None:
+            day = parse_date(data['due_date'])
+            if day is None:
+                raise ValueError(f'Неверная дата: {data["due_date"]}')
+            due_date = datetime.combine(day, time.min)
+        if timezone.is_naive(due_date):
+            due_date = timezone.make_aware(due_date)
+
+    return {
+        'title': title,
+        'description': (data.get('description') or '').strip(),
+        'assigned_to_id': assigned_to_id or None,
+        'due_date': due_date,
+    }
+
+
+def create_task(event, created_by, data):
+    """Новая задача в конце своей колонки. ValueError, если данные неверны"""
+    status = data.get('status') or 'todo'
+    if status not in STATUSES:
+        raise ValueError(f'Неизвестный статус: {status}')
+    fields = clean_task_data(event, data)
+    return Task.objects.create(
+        event=event,
+        created_by=created_by,
+        status=status,
+        rank=next_rank(event, status),
+        **fields
+    )
+
+
+def update_task(task, data):
+    """Меняем содержимое карточки; статус и место на доске меняет только move_tasks"""
+    for name, value in clean_task_data(task.event, data).items():
+        setattr(task, name, value)
+    task.save()
+    return task
+
+
+def parse_moves(items):
+    """[(task_id, status, after_id)] из [{'id': .., 'status': .., 'after_id': ..}].
+
+    after_id - карточка, под которую кладем задачу; None - в начало колонки.
+    """
+    moves = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError('Перемещение должно быть объектом {"id", "status", "after_id"}')
+        task_id, status, after_id = item.get('id'), item.get('status'), item.get('after_id')
+        if not str(task_id).isdigit():
+            raise ValueError(f'Неверный id задачи: {task_id}')
+        if status not in STATUSES:
+            raise ValueError(f'Неизвестный статус: {status}')
+        if after_id is not None and not str(after_id).isdigit():
+            raise ValueError(f'Неверный after_id: {after_id}')
+        if after_id is not None and int(after_id) == int(task_id):
+            raise ValueError(f'Задачу {task_id} нельзя положить под саму себя')
+        moves.append((int(task_id), status, int(after_id) if after_id is not None else None))
+    return moves
+
+
+def _rank_at(column, index):
+    """Ранг для карточки на позиции index (она уже вставлена) или None, если между соседями нет места"""
+    low = column[index - 1].rank if index > 0 else 0
+    if index + 1 == len(column):
+        return low + RANK_STEP
+    high = column[index + 1].rank
+    if high - low < 2:
+        return None
+    return (low + high) // 2
+
+
+def move_tasks(event, moves):
+    """Применяем перемещения по порядку и сохраняем одним bulk_update. Возвращает измененные задачи"""
+    with transaction.atomic():
+        tasks = list(Task.objects.select_for_update().filter(event=event).only(
+            'id', 'event_id', 'status', 'rank', 'due_date', 'assigned_to_id', 'remind_at'
+        ).order_by('status', 'rank', 'id'))
+        by_id = {task.id: task for task in tasks}
+        old_statuses = {task.id: task.status for task in tasks}
+        missing = sorted({
+            task_id for move in moves for task_id in (move[0], move[2])
+            if task_id is not None and task_id not in by_id
+        })
+        if missing:
+            raise ValueError(f'Задачи не найдены: {", ".join(map(str, missing))}')
+
+        columns = {status: [] for status in STATUSES}
+        for task in tasks:
+            columns.setdefault(task.status, []).append(task)
+
+        changed = {}
+        for task_id, status, after_id in moves:
+            task = by_id[task_id]
+            columns[task.status].remove(task)
+            column = columns[status]
+            if after_id is None:
+                index = 0
+            else:
+                after = by_id[after_id]
+                if after.status != status:
+                    raise ValueError(f'Задача {after_id} не в колонке {status}')
+                index = column.index(after) + 1
+            column.insert(index, task)
+            task.status = status
+
+            rank = _rank_at(column, index)
+            if rank is None:
+                # Промежуток исчерпан - перенумеровываем только эту колонку
+                for position, item in enumerate(column, start=1):
+                    if item.rank != position * RANK_STEP:
+                        item.rank = position * RANK_STEP
+                        changed[item.id] = item
+            else:
+                task.rank = rank
+            changed[task.id] = task
+
+        # bulk_update не трогает auto_now и не вызывает pre_save - updated_at и напоминание ставим сами
+        now = timezone.now()
+        for task in changed.values():
+            task.updated_at = now
+            if task.status != old_statuses[task.id]:
+                task.remind_at = reminders.task_remind_at(task)
+        Task.objects.bulk_update(changed.values(), ['status', 'rank', 'updated_at', 'remind_at'])
+    return list(changed.values())
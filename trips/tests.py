@@ -1,3 +1,253 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import expenses, geocoding, ledger, settlement
+from .forms import EventForm
+from .models import Event, EventParticipant, Expense, ExpenseParticipant, GeocodeCache, LedgerBalance
+
+GEOCODER_FIXTURE = [
+    {'address': 'Москва, Красная площадь, 1', 'latitude': 55.7539, 'longitude': 37.6208},
+    {'address': 'Санкт-Петербург, Дворцовая площадь, 2', 'latitude': 59.9398, 'longitude': 30.3146},
+]
+
+
+@override_settings(GEOCODER='trips.geocoding.FixtureGeocoder', GEOCODER_OPTIONS={'entries': GEOCODER_FIXTURE})
+class GeocodingTests(TestCase):
+    def setUp(self):
+        geocoding.clear_memory_cache()
+        geocoding._geocoder = None
+        self.user = User.objects.create_user('organizer', password='password')
+        self.client.force_login(self.user)
+
+    def event_form(self, **data):
+        return EventForm({
+            'title': 'Встреча',
+            'event_type': 'meeting',
+            'start_datetime': '2026-10-20T10:00',
+            'location_type': 'address',
+            **data
+        })
+
+    def test_geocode_uses_fixture_and_caches(self):
+        result = geocoding.geocode('москва  красная площадь 1')
+        self.assertEqual((result.latitude, result.longitude), (55.7539, 37.6208))
+        self.assertEqual(GeocodeCache.objects.count(), 1)
+
+        geocoding.clear_memory_cache()
+        with self.assertNumQueries(1):
+            self.assertEqual(geocoding.geocode('Москва, Красная площадь, 1'), result)
+        with self.assertNumQueries(0):
+            geocoding.geocode('МОСКВА КРАСНАЯ ПЛОЩАДЬ 1')
+        self.assertIsNone(geocoding.geocode('Нигде'))
+
+    def test_reverse_uses_fixture(self):
+        result = geocoding.reverse(59.93981, 30.31462)
+        self.assertEqual(result.address, 'Санкт-Петербург, Дворцовая площадь, 2')
+        self.assertIsNone(geocoding.reverse(0, 0))
+
+    def test_form_fills_coordinates_for_address(self):
+        form = self.event_form(address='Санкт-Петербург, Дворцовая площадь, 2')
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['latitude'], 59.9398)
+        self.assertEqual(form.cleaned_data['longitude'], 30.3146)
+
+    def test_form_rejects_coordinates_out_of_range(self):
+        form = self.event_form(location_type='map', address='Точка', latitude='999', longitude='37')
+        self.assertFalse(form.is_valid())
+
+    def test_map_point_does_not_overwrite_cache(self):
+        geocoding.geocode('Москва, Красная площадь, 1')
+        form = self.event_form(
+            location_type='map', address='Москва, Красная площадь, 1', latitude='10.0', longitude='20.0'
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        event = form.save(commit=False)
+        event.user = self.user
+        event.save()
+
+        geocoding.clear_memory_cache()
+        result = geocoding.geocode('Москва, Красная площадь, 1')
+        self.assertEqual((result.latitude, result.longitude), (55.7539, 37.6208))
+        self.assertIsNone(geocoding.reverse(10.0, 20.0))
+
+        form = self.event_form(address='Москва, Красная площадь, 1')
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['latitude'], 55.7539)
+
+    def test_map_point_is_not_cached(self):
+        form = self.event_form(location_type='map', address='Невский проспект 1', latitude='1.0', longitude='2.0')
+        self.assertTrue(form.is_valid(), form.errors)
+        event = form.save(commit=False)
+        event.user = self.user
+        event.save()
+
+        self.assertFalse(GeocodeCache.objects.exists())
+        form = self.event_form(address='Невский проспект 1')
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIsNone(form.cleaned_data['latitude'])
+
+    def test_remember_rejects_invalid_coordinates(self):
+        for latitude, longitude in [(float('nan'), 37), (55, float('inf')), (91, 0), (0, -181), (None, 0)]:
+            self.assertIsNone(geocoding.remember('Где-то', latitude, longitude))
+        self.assertFalse(GeocodeCache.objects.exists())
+
+    def test_api_does_not_accept_client_results(self):
+        response = self.client.post(
+            '/api/geocode/', '{"address": "Кремль", "lat": 1, "lng": 2}', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 405)
+        self.assertFalse(GeocodeCache.objects.exists())
+
+    def test_api_validates_coordinates(self):
+        self.assertEqual(self.client.get('/api/geocode/', {'lat': '95', 'lng': '10'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/geocode/', {'lat': 'nan', 'lng': '10'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/geocode/').status_code, 400)
+        self.assertEqual(self.client.get('/api/geocode/', {'address': 'Нигде'}).status_code, 404)
+
+
+class SplitTests(SimpleTestCase):
+    def test_distribute_gives_remainder_cents(self):
+        shares = expenses.distribute(Decimal('100.00'), {1: 1, 2: 1, 3: 1})
+        self.assertEqual(sum(shares.values()), Decimal('100.00'))
+        self.assertEqual(sorted(shares.values()), [Decimal('33.33'), Decimal('33.33'), Decimal('33.34')])
+
+        shares = expenses.distribute(Decimal('0.05'), {user_id: 1 for user_id in range(1, 8)})
+        self.assertEqual(sum(shares.values()), Decimal('0.05'))
+        self.assertEqual(sorted(shares.values()), [Decimal('0.00')] * 2 + [Decimal('0.01')] * 5)
+
+    def test_split_sums_to_amount(self):
+        amount = Decimal('1234.57')
+        cases = [
+            ('equal', [1, 2, 3, 4, 5, 6, 7]),
+            ('exact', {1: '1000.00', 2: '234.57'}),
+            ('percent', {1: '33.3', 2: '33.3', 3: '33.4'}),
+            ('weights', {1: 1, 2: 2, 3: '0.5'}),
+        ]
+        for mode, shares in cases:
+            with self.subTest(mode=mode):
+                result = expenses.split(amount, mode, shares)
+                self.assertEqual(sum(result.values()), amount)
+                self.assertTrue(all(share.quantize(expenses.CENT) == share for share in result.values()))
+
+    def test_split_validation(self):
+        amount = Decimal('100.00')
+        invalid = [
+            ('exact', {1: '60.00', 2: '30.00'}),
+            ('exact', {1: '50.005', 2: '49.995'}),
+            ('exact', {1: '-10.00', 2: '110.00'}),
+            ('percent', {1: 50, 2: 40}),
+            ('weights', {1: 0, 2: 0}),
+            ('weights', {1: 'много'}),
+            ('weights', {1: 'nan'}),
+            ('equal', []),
+            ('shares', [1, 2]),
+        ]
+        for mode, shares in invalid:
+            with self.subTest(mode=mode, shares=shares):
+                with self.assertRaises(ValueError):
+                    expenses.split(amount, mode, shares)
+
+    def test_simplify_settles_every_balance(self):
+        balances = {1: Decimal('70.00'), 2: Decimal('-50.00'), 3: Decimal('-45.00'), 4: Decimal('25.00')}
+        transfers = settlement.simplify(balances)
+        self.assertLessEqual(len(transfers), len(balances) - 1)
+        left = dict(balances)
+        for debtor_id, creditor_id, amount in transfers:
+            self.assertGreater(amount, 0)
+            left[debtor_id] += amount
+            left[creditor_id] -= amount
+        self.assertTrue(all(value == 0 for value in left.values()), left)
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = [
+            User.objects.create_user(username, password='password') for username in ('alice', 'bob', 'carol')
+        ]
+        self.event = Event.objects.create(user=self.alice, title='Поход', start_datetime=timezone.now())
+        for user in (self.bob, self.carol):
+            EventParticipant.objects.create(event=self.event, user=user, status='accepted')
+        settlement.invalidate(self.event.id)
+
+    def create(self, amount, paid_by, split=None):
+        return expenses.create_expenses(self.event, self.alice, [{
+            'title': 'Расход', 'amount': amount, 'paid_by_id': paid_by.id, 'split': split,
+        }])[0]
+
+    def assertConsistent(self):
+        balances = settlement.balances(self.event.id)
+        self.assertEqual(sum(balances.values(), Decimal('0')), 0)
+
+        left = dict(balances)
+        for debtor_id, creditor_id, amount in settlement.simplify(balances):
+            left[debtor_id] += amount
+            left[creditor_id] -= amount
+        self.assertTrue(all(value == 0 for value in left.values()), left)
+
+        # Личные балансы - только из этого мероприятия, поэтому совпадают с его балансами
+        for user in (self.alice, self.bob, self.carol):
+            total = sum((amount for _, amount in ledger.user_balances(user)), Decimal('0'))
+            self.assertEqual(total, balances.get(user.id, 0))
+
+        out = StringIO()
+        call_command('rebuild_ledger', '--check', stdout=out)
+        self.assertIn('лишних: 0, расхождений: 0, недостающих: 0', out.getvalue())
+
+    def test_create_expenses(self):
+        self.create('100.00', self.alice)
+        self.create('90.00', self.bob, {'mode': 'exact', 'shares': [
+            {'user_id': self.alice.id, 'value': '30.00'}, {'user_id': self.carol.id, 'value': '60.00'},
+        ]})
+        self.create('10.01', self.carol, {'mode': 'weights', 'shares': [
+            {'user_id': self.alice.id, 'value': 1}, {'user_id': self.bob.id, 'value': 2},
+        ]})
+        for expense in Expense.objects.all():
+            self.assertEqual(sum(expense.participants.values_list('share_amount', flat=True)), expense.amount)
+        self.assertConsistent()
+        self.assertEqual(settlement.balances(self.event.id)[self.carol.id], Decimal('-83.32'))
+
+    def test_pay_settle_reopen_and_delete(self):
+        expense = self.create('100.00', self.alice)
+        self.create('60.00', self.bob)
+        self.assertConsistent()
+
+        share = ExpenseParticipant.objects.get(expense=expense, user=self.carol)
+        share.is_paid = True
+        share.save()
+        self.assertConsistent()
+
+        expense.is_settled = True
+        expense.save()
+        self.assertConsistent()
+
+        expense.is_settled = False
+        expense.paid_by = self.bob
+        expense.save()
+        self.assertConsistent()
+
+        ExpenseParticipant.objects.get(expense=expense, user=self.alice).delete()
+        self.assertConsistent()
+
+        expense.delete()
+        self.assertConsistent()
+
+    def test_event_and_user_cascade(self):
+        self.create('100.00', self.alice)
+        self.create('45.00', self.carol)
+        other = Event.objects.create(user=self.bob, title='Ужин', start_datetime=timezone.now())
+        EventParticipant.objects.create(event=other, user=self.alice, status='accepted')
+        expenses.create_expenses(other, self.bob, [{'title': 'Ужин', 'amount': '20.00', 'paid_by_id': self.bob.id}])
+
+        self.event.delete()
+        out = StringIO()
+        call_command('rebuild_ledger', '--check', stdout=out)
+        self.assertIn('лишних: 0, расхождений: 0, недостающих: 0', out.getvalue())
+        self.assertEqual(ledger.user_balances(self.bob), [(self.alice, Decimal('10.00'))])
+
+        self.alice.delete()
+        self.assertFalse(LedgerBalance.objects.exists())
@@ -0,0 +1,99 @@
+# trips/user_search.py
+"""Поиск пользователей по имени: префикс по индексу + триграммы для опечаток.
+
+Индекс (UsernameIndex, UsernameTrigram) обновляется сигналом при сохранении
+пользователя, поэтому поиск при каждом нажатии клавиши не сканирует auth_user.
+"""
+import math
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.contrib.auth.models import User
+
+from .models import FriendRequest, Friendship, UsernameIndex, UsernameTrigram
+
+SEARCH_LIMIT = 10
+
+# Минимальное сходство (как similarity_threshold в pg_trgm)
+SIMILARITY_THRESHOLD = 0.3
+
+# Сколько кандидатов по триграммам берем на один результат
+TRIGRAM_CANDIDATES = 5
+
+
+def normalize(username):
+    return (username or '').strip().lower()
+
+
+def trigrams(value):
+    """Триграммы строки с отступами, как в pg_trgm: '  ab' ... 'yz '"""
+    padded = f'  {normalize(value)} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(query_trigrams, username):
+    candidate = trigrams(username)
+    shared = len(query_trigrams & candidate)
+    return shared / (len(query_trigrams) + len(candidate) - shared)
+
+
+def index_user(user):
+    """Перестраиваем индекс пользователя, если имя изменилось"""
+    username = normalize(user.username)
+    with transaction.atomic():
+        current = UsernameIndex.objects.filter(user_id=user.pk).values_list('username', flat=True).first()
+        if current == username:
+            return
+        UsernameIndex.objects.update_or_create(user_id=user.pk, defaults={'username': username})
+        UsernameTrigram.objects.filter(user_id=user.pk).delete()
+        UsernameTrigram.objects.bulk_create(
+            UsernameTrigram(user_id=user.pk, trigram=trigram) for trigram in trigrams(username)
+        )
+
+
+def search_user_ids(query, exclude_id=None, limit=SEARCH_LIMIT):
+    """id пользователей: сначала совпадения по началу имени, затем похожие по триграммам"""
+    query = normalize(query)
+    if not query:
+        return []
+
+    prefix_matches = UsernameIndex.objects.filter(
+        username__gte=query,
+        username__lt=query + '\uffff'
+    ).exclude(user_id=exclude_id).order_by('username').values_list('user_id', flat=True)
+    ids = list(prefix_matches[:limit])
+    if len(ids) >= limit or len(query) < 3:
+        return ids
+
+    query_trigrams = trigrams(query)
+    min_shared = max(1, math.ceil(len(query_trigrams) * SIMILARITY_THRESHOLD))
+    candidates = UsernameTrigram.objects.filter(
+        trigram__in=query_trigrams
+    ).exclude(user_id__in=ids + [exclude_id]).values('user_id').annotate(
+        shared=Count('id')
+    ).filter(shared__gte=min_shared).order_by('-shared', 'user_id').values_list('user_id', flat=True)
+    candidate_ids = list(candidates[:limit * TRIGRAM_CANDIDATES])
+
+    usernames = dict(UsernameIndex.objects.filter(user_id__in=candidate_ids).values_list('user_id', 'username'))
+    scored = sorted(
+        ((similarity(query_trigrams, usernames[user_id]), usernames[user_id], user_id)
+         for user_id in candidate_ids if user_id in usernames),
+        key=lambda item: (-item[0], item[1])
+    )
+    ids += [user_id for score, _, user_id in scored if score >= SIMILARITY_THRESHOLD][:limit - len(ids)]
+    return ids
+
+
+def users_with_relationship(viewer, user_ids):
+    """Пользователи в порядке user_ids со статусом отношений к viewer - одним запросом"""
+    sent = FriendRequest.objects.filter(from_user=viewer, to_user=OuterRef('pk'))
+    received = FriendRequest.objects.filter(from_user=OuterRef('pk'), to_user=viewer)
+    users = User.objects.filter(id__in=user_ids).annotate(
+        is_friend=Exists(Friendship.objects.filter(Friendship.between(viewer, OuterRef('pk')))),
+        sent_request_id=Subquery(sent.values('id')[:1]),
+        sent_request_accepted=Subquery(sent.values('is_accepted')[:1]),
+        received_request_id=Subquery(received.values('id')[:1]),
+        received_request_accepted=Subquery(received.values('is_accepted')[:1]),
+    )
+    by_id = {user.id: user for user in users}
+    return [by_id[user_id] for user_id in user_ids if user_id in by_id]
@@ -31,99 +31,21 @@ def create_event_view(request):
 
 @login_required
 def my_events_view(request):
-    """Показ мероприятий пользователя - УПРОЩЕННАЯ И РАБОЧАЯ ВЕРСИЯ"""
-    from trips.models import Event, EventParticipant
+    """Показ мероприятий пользователя: организованные и с участием - одним запросом, постранично"""
+    from trips.listing import paginate_keyset, user_events
 
-    print("=" * 60)
-    print(f"MY EVENTS VIEW - Пользователь: {request.user.username} (ID: {request.user.id})")
-    print("=" * 60)
-
-    # 1. Мероприятия где пользователь организатор
-    organized_events = Event.objects.filter(
-        user=request.user,
-        is_active=True
-    ).order_by('-start_datetime')
-
-    print(f"Организованные мероприятия: {organized_events.count()}")
-
-    # 2. Мероприятия где пользователь участник - ПРОСТО И ПОНЯТНО!
-    # Получаем ВСЕ записи EventParticipant для пользователя
-    all_participations = EventParticipant.objects.filter(
-        user=request.user
-    ).select_related('event')
-
-    print(f"\nВсе записи EventParticipant для пользователя: {all_participations.count()}")
-
-    for p in all_participations:
-        print(f"  - ID:{p.id}, Event ID:{p.event_id}, Status:'{p.status}', Event Title:'{p.event.title}'")
-
-    # Фильтруем только подходящие статусы
-    valid_statuses = ['accepted', 'confirmed', 'invited']  # Все кроме declined
-    valid_participations = all_participations.filter(
-        status__in=valid_statuses
-    )
-
-    print(f"\nЗаписи с валидными статусами {valid_statuses}: {valid_participations.count()}")
-
-    # Получаем ID мероприятий
-    event_ids = valid_participations.values_list('event_id', flat=True)
-    print(f"ID мероприятий для участия: {list(event_ids)}")
-
-    # Получаем сами мероприятия
-    participating_events = Event.objects.filter(
-        id__in=event_ids,
-        is_active=True
-    ).exclude(user=request.user)  # Исключаем где пользователь организатор
-
-    print(f"Участвую в мероприятиях: {participating_events.count()}")
-    for event in participating_events:
-        print(f"  - ID:{event.id}, Title:'{event.title}', Организатор:{event.user.username}")
-
-    # 3. Приглашения (только invited статус)
-    pending_invitations = all_participations.filter(status='invited')
-    print(f"\nОжидающие приглашения: {pending_invitations.count()}")
-
-    # 4. ВСЕ мероприятия для отображения
-    all_events = list(organized_events) + list(participating_events)
-
-    print(f"\nИТОГО:")
-    print(f"Организованные: {len(organized_events)}")
-    print(f"Участвую: {len(participating_events)}")
-    print(f"Приглашения: {pending_invitations.count()}")
-    print(f"Всего мероприятий: {len(all_events)}")
-
-    # ДЕБАГ: Если homa не видит мероприятия, проверим вручную
-    if request.user.username == 'homa' and len(all_events) == 0:
-        print("\n!!! ДЕБАГ ДЛЯ HOMA !!!")
-        # Вручную проверим EventParticipant
-        manual_check = EventParticipant.objects.filter(
-            user__username='homa',
-            status__in=['accepted', 'confirmed']
-        )
-        print(f"Ручная проверка EventParticipant для homa: {manual_check.count()}")
-        for mp in manual_check:
-            print(f"  - Event ID:{mp.event_id}, Status:{mp.status}")
-
-            # Проверим существует ли мероприятие
-            try:
-                event = Event.objects.get(id=mp.event_id)
-                print(f"    Мероприятие найдено: '{event.title}' (ID:{event.id}), is_active:{event.is_active}")
-                if event.is_active:
-                    print(f"    ДОБАВЛЯЕМ В СПИСОК!")
-                    all_events.append(event)
-                    participating_events = list(participating_events) + [event]
-            except Event.DoesNotExist:
-                print(f"    ОШИБКА: Мероприятие ID:{mp.event_id} не найдено!")
-
-    print("=" * 60)
+    try:
+        events, next_cursor = paginate_keyset(user_events(request.user), request.GET.get('cursor'))
+    except ValueError:
+        return redirect('my_events')
+    access.for_request(request).roles_for(events)
 
     return render(request, 'my_events.html', {
-        'events': all_events,
-        'organized_events': organized_events,
-        'participating_events': participating_events,
-        'pending_invitations': pending_invitations,
-        'total_events': len(all_events),
-        'debug': True
+        'events': events,
+        'organized_events': [e for e in events if e.viewer_role == 'organizer'],
+        'participating_events': [e for e in events if e.viewer_role != 'organizer'],
+        'pending_invitations': [e for e in events if e.viewer_role == 'invited'],
+        'next_cursor': next_cursor,
     })
 
 
@@ -137,41 +59,23 @@ def event_detail_view(request, event_id):
         # Находим мероприятие (не проверяем user=request.user - участники тоже должны видеть)
         event = get_object_or_404(Event, id=event_id, is_active=True)
 
-        # Проверяем доступ пользователя
-        can_access = False
-
-        # 1. Пользователь организатор
-        if event.user == request.user:
-            can_access = True
-
-        # 2. Пользователь участник
-        elif EventParticipant.objects.filter(event=event, user=request.user,
-                                             status__in=['accepted', 'confirmed']).exists():
-            can_access = True
-
-        # 3. Пользователь приглашен (ожидает ответа)
-        elif EventParticipant.objects.filter(event=event, user=request.user, status='invited').exists():
-            can_access = True
-
-        if not can_access:
+        # Организатор, участник или приглашенный (ожидает ответа)
+        event_access = access.for_request(request)
+        if not event_access.can_view(event):
             return render(request, 'event_detail.html', {
                 'error': 'У вас нет доступа к этому мероприятию',
                 'event_id': event_id
             })
 
         # Получаем участников мероприятия
-        participants = EventParticipant.objects.filter(event=event).select_related('user', 'invited_by')
+        participants = list(EventParticipant.objects.filter(event=event).select_related('user', 'invited_by'))
 
-        # Определяем роль пользователя в мероприятии
-        user_role = 'guest'
+        # Роль пользователя в мероприятии; его строку участника берем из уже загруженного списка
+        user_role = event_access.role(event)
         user_participant = None
-
-        if event.user == request.user:
-            user_role = 'organizer'
-        else:
-            user_participant = EventParticipant.objects.filter(event=event, user=request.user).first()
-            if user_participant:
-                user_role = user_participant.status  # invited, accepted, etc.
+        if user_role != access.ORGANIZER:
+            participant_id = event_access.participant_id(event)
+            user_participant = next((p for p in participants if p.id == participant_id), None)
 
         # Подготавливаем данные для карты
         map_data = None
@@ -189,7 +93,7 @@ def event_detail_view(request, event_id):
             'map_data': map_data,
             'user_role': user_role,
             'user_participant': user_participant,
-            'can_edit': event.user == request.user,  # Только организатор может редактировать
+            'can_edit': event_access.is_organizer(event),  # Только организатор может редактировать
         })
 
     except Event.DoesNotExist:
@@ -236,31 +140,20 @@ from django.http import JsonResponse
 from django.contrib.auth.models import User
 from .models import Friendship, FriendRequest, Event, EventParticipant, Notification
 from .forms import FriendSearchForm, FriendRequestForm, EventInviteForm
+from . import access, invitations, notifications, suggestions, user_search
+from .pubsub import broker
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
 import json
 
 
 @login_required
 def friends_list_view(request):
     """Страница списка друзей - ФИНАЛЬНАЯ ВЕРСИЯ"""
-    from django.db.models import Q
-
-    # 1. Находим всех друзей
-    friendships = Friendship.objects.filter(
-        confirmed=True
-    ).filter(
-        Q(user=request.user) | Q(friend=request.user)
-    )
-
-    # 2. Собираем ID всех друзей
-    friend_ids = []
-    for f in friendships:
-        if f.user.id == request.user.id:
-            friend_ids.append(f.friend.id)
-        else:
-            friend_ids.append(f.user.id)
-
-    # 3. Получаем объекты User
-    friends = User.objects.filter(id__in=friend_ids)
+    # 1-3. Друзья: одна строка дружбы на пару, поэтому два подзапроса по индексам
+    friends = Friendship.friends_of(request.user)
 
     # 4. Входящие заявки
     incoming_requests = FriendRequest.objects.filter(
@@ -283,6 +176,7 @@ def friends_list_view(request):
         'incoming_requests': incoming_requests,
         'outgoing_requests': outgoing_requests,
         'search_form': search_form,
+        'friend_suggestions': suggestions.top_suggestions(request.user),
         'active_tab': 'friends',
     }
 
@@ -302,85 +196,19 @@ def search_friends_view(request):
                 messages.error(request, 'Введите имя пользователя для поиска')
                 return redirect('friends')
 
-        # Ищем пользователей (исключая себя)
-        users = User.objects.filter(
-            username__icontains=username
-        ).exclude(id=request.user.id).order_by('username')[:10]
-
-        # Получаем ID друзей (confirmed=True)
-        friend_ids = Friendship.objects.filter(
-            user=request.user,
-            confirmed=True
-        ).values_list('friend_id', flat=True)
-
-        # ===== ИСПРАВЛЕННАЯ ЧАСТЬ =====
-        # 1. Получаем ВСЕ заявки между пользователями
-        all_requests = FriendRequest.objects.filter(
-            Q(from_user=request.user) | Q(to_user=request.user)
-        )
-
-        # Создаем словари для быстрого поиска
-        sent_requests_dict = {}  # Я → другие
-        received_requests_dict = {}  # Другие → я
-        accepted_requests_dict = {}  # Принятые заявки
-
-        for req in all_requests:
-            if req.from_user == request.user:
-                # Заявки, которые Я отправил
-                sent_requests_dict[req.to_user.id] = {
-                    'id': req.id,
-                    'is_accepted': req.is_accepted
-                }
-                if req.is_accepted:
-                    accepted_requests_dict[req.to_user.id] = req.id
-            else:
-                # Заявки, которые МНЕ отправили
-                received_requests_dict[req.from_user.id] = {
-                    'id': req.id,
-                    'is_accepted': req.is_accepted
-                }
-                if req.is_accepted:
-                    accepted_requests_dict[req.from_user.id] = req.id
-
-        # 2. Восстанавливаем дружбу из принятых заявок
-        for user in users:
-            user_id = user.id
-
-            # Проверяем, есть ли принятая заявка, но нет дружбы
-            if user_id in accepted_requests_dict and user_id not in friend_ids:
-                print(f"Восстанавливаем дружбу с {user.username} из принятой заявки")
-                try:
-                    # Создаем двустороннюю дружбу
-                    Friendship.objects.get_or_create(
-                        user=request.user,
-                        friend=user,
-                        defaults={'confirmed': True}
-                    )
-                    Friendship.objects.get_or_create(
-                        user=user,
-                        friend=request.user,
-                        defaults={'confirmed': True}
-                    )
-                    # Добавляем в список друзей
-                    friend_ids = list(friend_ids) + [user_id]
-                except Exception as e:
-                    print(f"Ошибка восстановления дружбы: {e}")
+        # Ищем пользователей (исключая себя) по индексу имен, статус отношений - одним запросом на страницу
+        user_ids = user_search.search_user_ids(username, exclude_id=request.user.id)
+        users = user_search.users_with_relationship(request.user, user_ids)
 
         # ===== ПОДГОТОВКА РЕЗУЛЬТАТОВ =====
         results = []
         for user in users:
-            user_id = user.id
-
-            # Основные статусы
-            is_friend = user_id in friend_ids
-            sent_info = sent_requests_dict.get(user_id)
-            received_info = received_requests_dict.get(user_id)
+            is_friend = user.is_friend
 
             # Определяем тип заявки
-            has_sent_request = sent_info is not None and not sent_info['is_accepted']
-            has_received_request = received_info is not None and not received_info['is_accepted']
-            has_accepted_request = (sent_info and sent_info['is_accepted']) or \
-                                   (received_info and received_info['is_accepted'])
+            has_sent_request = user.sent_request_id is not None and not user.sent_request_accepted
+            has_received_request = user.received_request_id is not None and not user.received_request_accepted
+            has_accepted_request = bool(user.sent_request_accepted or user.received_request_accepted)
 
             user_data = {
                 'id': user.id,
@@ -394,12 +222,12 @@ def search_friends_view(request):
             }
 
             # Добавляем ID заявок если есть
-            if sent_info:
-                user_data['sent_request_id'] = sent_info['id']
-                user_data['sent_request_accepted'] = sent_info['is_accepted']
-            if received_info:
-                user_data['received_request_id'] = received_info['id']
-                user_data['received_request_accepted'] = received_info['is_accepted']
+            if user.sent_request_id is not None:
+                user_data['sent_request_id'] = user.sent_request_id
+                user_data['sent_request_accepted'] = user.sent_request_accepted
+            if user.received_request_id is not None:
+                user_data['received_request_id'] = user.received_request_id
+                user_data['received_request_accepted'] = user.received_request_accepted
 
             # Если есть принятая заявка, но мы не друзья (что-то пошло не так)
             if has_accepted_request and not is_friend:
@@ -424,10 +252,10 @@ def search_friends_view(request):
                 'count': len(results),
                 'query': username,
                 'debug': {
-                    'total_users_found': users.count(),
-                    'friend_ids': list(friend_ids),
-                    'sent_requests': len(sent_requests_dict),
-                    'received_requests': len(received_requests_dict),
+                    'total_users_found': len(users),
+                    'friend_ids': [user.id for user in users if user.is_friend],
+                    'sent_requests': sum(user.sent_request_id is not None for user in users),
+                    'received_requests': sum(user.received_request_id is not None for user in users),
                 }
             })
         else:
@@ -468,11 +296,7 @@ def send_friend_request_view(request, user_id):
             })
 
         # 3. Проверка: уже друзья?
-        is_already_friend = Friendship.objects.filter(
-            user=request.user,
-            friend=to_user,
-            confirmed=True
-        ).exists()
+        is_already_friend = Friendship.are_friends(request.user, to_user)
 
         print(f"Уже друзья? {is_already_friend}")
 
@@ -501,22 +325,11 @@ def send_friend_request_view(request, user_id):
         your_request = existing_requests.filter(from_user=request.user).first()
         if your_request:
             if your_request.is_accepted:
-                # Заявка уже принята - должны быть друзьями
-                print(f"Заявка уже принята! Создаём записи дружбы...")
-                Friendship.objects.get_or_create(
-                    user=request.user,
-                    friend=to_user,
-                    defaults={'confirmed': True}
-                )
-                Friendship.objects.get_or_create(
-                    user=to_user,
-                    friend=request.user,
-                    defaults={'confirmed': True}
-                )
+                # Заявка принята, а дружбы нет - рассинхрон чинит команда repair_friendships
+                print(f"Заявка уже принята, но дружбы нет (ID: {your_request.id})")
                 return JsonResponse({
-                    'success': True,
-                    'message': f'Вы теперь друзья с {to_user.username}!',
-                    'already_friends': True
+                    'success': False,
+                    'error': f'Заявка уже принята {to_user.username}'
                 })
             else:
                 # Заявка ещё не принята
@@ -587,26 +400,13 @@ def accept_friend_request_view(request, request_id):
                 print("Заявка уже принята!")
                 messages.info(request, 'Заявка уже была принята ранее')
             else:
-                # Принимаем заявку
-                friend_request.is_accepted = True
-                friend_request.save()
-                print("Заявка помечена как принятая")
-
-                # Создаем двустороннюю дружбу
-                friendship1, created1 = Friendship.objects.get_or_create(
-                    user=request.user,
-                    friend=friend_request.from_user,
-                    defaults={'confirmed': True}
-                )
-
-                friendship2, created2 = Friendship.objects.get_or_create(
-                    user=friend_request.from_user,
-                    friend=request.user,
-                    defaults={'confirmed': True}
-                )
-
-                print(f"Создана дружба 1: {created1} (ID: {friendship1.id})")
-                print(f"Создана дружба 2: {created2} (ID: {friendship2.id})")
+                # Принимаем заявку и создаем дружбу одной транзакцией
+                with transaction.atomic():
+                    friend_request.is_accepted = True
+                    friend_request.save()
+                    friendship, created = Friendship.befriend(request.user, friend_request.from_user)
+
+                print(f"Заявка принята, дружба создана: {created} (ID: {friendship.id})")
 
                 messages.success(request, f'Вы теперь друзья с {friend_request.from_user.username}!')
 
@@ -640,15 +440,8 @@ def remove_friend_view(request, user_id):
     if request.method == 'POST':
         friend = get_object_or_404(User, id=user_id)
 
-        # Удаляем двустороннюю дружбу
-        Friendship.objects.filter(
-            user=request.user,
-            friend=friend
-        ).delete()
-        Friendship.objects.filter(
-            user=friend,
-            friend=request.user
-        ).delete()
+        # Удаляем дружбу (одна строка на пару)
+        Friendship.unfriend(request.user, friend)
 
         # Удаляем заявки
         FriendRequest.objects.filter(
@@ -669,7 +462,10 @@ def remove_friend_view(request, user_id):
 def invite_friend_to_event_view(request, event_id, user_id):
     """Приглашение друга в мероприятие"""
     if request.method == 'POST':
-        event = get_object_or_404(Event, id=event_id)
+        event = access.for_request(request).get_event(event_id, access.MEMBER_ROLES)
+        if event is None:
+            messages.error(request, 'Приглашать могут только участники мероприятия')
+            return redirect('my_events')
         friend = get_object_or_404(User, id=user_id)
 
         # Проверяем, есть ли уже приглашение
@@ -700,17 +496,12 @@ def invite_friend_to_event_view(request, event_id, user_id):
 def get_friends_ajax(request):
     """AJAX получение списка друзей для приглашения"""
     # Получаем подтвержденных друзей
-    friendships = Friendship.objects.filter(
-        user=request.user,
-        confirmed=True
-    ).select_related('friend')
-
     friends_list = []
-    for friendship in friendships:
+    for friend in Friendship.friends_of(request.user).order_by('username'):
         friends_list.append({
-            'id': friendship.friend.id,
-            'username': friendship.friend.username,
-            'email': friendship.friend.email,
+            'id': friend.id,
+            'username': friend.username,
+            'email': friend.email,
         })
 
     return JsonResponse({
@@ -722,9 +513,11 @@ def get_friends_ajax(request):
 
 @login_required
 def get_event_participants_api(request, event_id):
-    """API для получения участников мероприятия"""
+    """API для получения участников мероприятия (для всех, кто видит мероприятие)"""
     try:
-        event = Event.objects.get(id=event_id, user=request.user)
+        event = access.for_request(request).get_event(event_id)
+        if event is None:
+            raise Event.DoesNotExist
         participants = EventParticipant.objects.filter(event=event).select_related('user', 'invited_by')
 
         participants_list = []
@@ -758,108 +551,159 @@ def get_event_participants_api(request, event_id):
 def invite_to_event_view(request, event_id):
     """AJAX: Приглашение друга в мероприятие"""
     try:
-        event = Event.objects.get(id=event_id)
+        event = access.for_request(request).get_event(event_id, access.MEMBER_ROLES)
+        if event is None:
+            return JsonResponse({'success': False, 'error': 'Мероприятие не найдено'}, status=404)
         data = json.loads(request.body)
         friend_id = data.get('friend_id')
         role = data.get('role', 'Участник')
 
-        # Проверяем что это действительно друг
-        is_friend = Friendship.objects.filter(
-            user=request.user,
-            friend_id=friend_id,
-            confirmed=True
-        ).exists()
-
-        if not is_friend:
+        if not str(friend_id).isdigit():
             return JsonResponse({
                 'success': False,
                 'error': 'Пользователь не является вашим другом'
             })
 
-        friend = User.objects.get(id=friend_id)
-
-        # Проверяем не приглашен ли уже
-        existing_invite = EventParticipant.objects.filter(
-            event=event,
-            user=friend
-        ).first()
-
-        if existing_invite:
+        result = invitations.invite_many(event, request.user, [(int(friend_id), role)])[0]
+        if not result['success']:
             return JsonResponse({
                 'success': False,
-                'error': f'{friend.username} уже приглашен'
+                'error': result['error']
             })
 
-        # Создаем приглашение
-        participant = EventParticipant.objects.create(
-            event=event,
-            user=friend,
-            invited_by=request.user,
-            status='invited',
-            role=role
-        )
-
-        # Создаем уведомление для друга
-        Notification.objects.create(
-            user=friend,
-            notification_type='event_invitation',
-            title=f'Приглашение в мероприятие',
-            message=f'{request.user.username} пригласил вас в мероприятие "{event.title}"',
-            related_event=event,
-            related_user=request.user
-        )
-
+        participant = result['participant']
         return JsonResponse({
             'success': True,
-            'message': f'{friend.username} приглашен в мероприятие',
-            'participant_id': participant.id,
-            'participant': {
-                'id': participant.id,
-                'user_id': friend.id,
-                'username': friend.username,
-                'role': role,
-                'status': 'invited',
-                'status_display': 'Приглашен',
-                'invited_by': request.user.username
-            }
+            'message': f'{participant["username"]} приглашен в мероприятие',
+            'participant_id': participant['id'],
+            'participant': participant
         })
 
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+@login_required
+@require_POST
+def invite_many_to_event_view(request, event_id):
+    """AJAX: Приглашение нескольких друзей одним запросом.
+
+    {"invites": [{"friend_id": 1, "role": "Водитель"}, ...]} или
+    {"friend_ids": [1, 2, 3], "role": "Участник"}. Результат - по каждому другу.
+    """
+    event = access.for_request(request).get_event(event_id, access.MEMBER_ROLES)
+    if event is None:
+        return JsonResponse({'success': False, 'error': 'Мероприятие не найдено'}, status=404)
+    try:
+        data = json.loads(request.body)
+        items = data.get('invites')
+        if items is None:
+            items = data.get('friend_ids', [])
+        if not isinstance(items, list):
+            raise ValueError('Ожидается список приглашений')
+        invites = invitations.parse_invites(items, data.get('role') or invitations.DEFAULT_ROLE)
+    except (json.JSONDecodeError, AttributeError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    if not invites:
+        return JsonResponse({'success': False, 'error': 'Не выбрано ни одного друга'}, status=400)
+    if len(invites) > invitations.MAX_BATCH_INVITES:
+        return JsonResponse({
+            'success': False,
+            'error': f'Не больше {invitations.MAX_BATCH_INVITES} приглашений за раз'
+        }, status=400)
+
+    try:
+        results = invitations.invite_many(event, request.user, invites)
+    except IntegrityError:
+        # Кого-то пригласили параллельно - пусть клиент повторит с актуальным списком
+        return JsonResponse({
+            'success': False,
+            'error': 'Список участников изменился, повторите приглашение'
+        }, status=409)
+
+    invited_count = sum(1 for result in results if result['success'])
+    return JsonResponse({
+        'success': invited_count > 0,
+        'message': f'Приглашено: {invited_count} из {len(results)}',
+        'invited_count': invited_count,
+        'results': results
+    })
+
+
 # В views.py добавьте:
 @login_required
 def get_notifications_api(request):
-    """API для получения уведомлений пользователя"""
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')[:20]
-
-    notifications_list = []
-    for notification in notifications:
-        notifications_list.append({
-            'id': notification.id,
-            'type': notification.notification_type,
-            'type_display': notification.get_notification_type_display(),
-            'title': notification.title,
-            'message': notification.message,
-            'is_read': notification.is_read,
-            'created_at': notification.created_at.strftime('%d.%m.%Y %H:%M'),
-            'event_id': notification.related_event.id if notification.related_event else None,
-            'event_title': notification.related_event.title if notification.related_event else None,
-            'from_user': notification.related_user.username if notification.related_user else None,
-            'from_user_id': notification.related_user.id if notification.related_user else None,
-        })
+    """API для получения уведомлений пользователя.
+
+    ?cursor= - следующая страница вглубь истории, ?since= - только новые.
+    Уведомления не помечаются прочитанными - для этого mark_all_read_api.
+    """
+    try:
+        limit = int(request.GET.get('limit', 20))
+        page, next_cursor, since, has_more = notifications.notifications_page(
+            request.user,
+            cursor=request.GET.get('cursor'),
+            since=request.GET.get('since'),
+            limit=limit
+        )
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'notifications': [notifications.serialize_notification(notification) for notification in page],
+        'next_cursor': next_cursor,
+        'since': since,
+        'has_more': has_more,
+        'unread_count': notifications.unread_count(request.user.id)
+    })
 
-    # Помечаем все как прочитанные
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
 
+@login_required
+def unread_count_api(request):
+    """Только счетчик непрочитанных - одно чтение по первичному ключу"""
     return JsonResponse({
         'success': True,
-        'notifications': notifications_list,
-        'unread_count': Notification.objects.filter(user=request.user, is_read=False).count()
+        'unread_count': notifications.unread_count(request.user.id)
     })
 
 
+async def notifications_stream(request):
+    """Поток уведомлений (server-sent events) вместо опроса раз в 30 секунд.
+
+    Работает под ASGI (DjangoProject/asgi.py). Пока событий нет, соединение не
+    делает запросов к БД - только пустой комментарий раз в STREAM_HEARTBEAT секунд.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Под WSGI бесконечный поток занял бы рабочий поток - клиент перейдет на опрос
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'success': False, 'error': 'Требуется вход'}, status=401)
+
+    async def events():
+        subscription = broker.subscribe(notifications.user_channel(user.id))
+        try:
+            count = await sync_to_async(notifications.unread_count)(user.id)
+            yield 'retry: 5000\n\n'
+            yield f'event: unread_count\ndata: {json.dumps({"unread_count": count})}\n\n'
+            while True:
+                message = await subscription.get(timeout=notifications.STREAM_HEARTBEAT)
+                if message is None:
+                    yield ': ping\n\n'
+                    continue
+                yield f"event: {message['event']}\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx не должен буферизовать поток
+    return response
+
+
 @login_required
 @require_POST
 def respond_to_invitation_view(request, participant_id):
@@ -899,8 +743,8 @@ def respond_to_invitation_view(request, participant_id):
             print(f"Status changed to: {participant.status}")
 
             # Создаем уведомление для организатора
-            Notification.objects.create(
-                user=participant.invited_by,
+            notifications.notify_many(
+                [participant.invited_by],
                 notification_type='event_update',
                 title='Приглашение принято',
                 message=f'{request.user.username} принял ваше приглашение в мероприятие "{event.title}"',
@@ -928,8 +772,8 @@ def respond_to_invitation_view(request, participant_id):
             print(f"Status changed to: {participant.status}")
 
             # Создаем уведомление для организатора
-            Notification.objects.create(
-                user=participant.invited_by,
+            notifications.notify_many(
+                [participant.invited_by],
                 notification_type='event_update',
                 title='Приглашение отклонено',
                 message=f'{request.user.username} отклонил ваше приглашение в мероприятие "{event.title}"',
@@ -967,13 +811,15 @@ def respond_to_invitation_view(request, participant_id):
 def cancel_event_invitation_view(request, event_id, participant_id):
     """Отмена приглашения в мероприятие"""
     try:
-        # Находим приглашение
-        participant = EventParticipant.objects.get(
+        # Находим приглашение: отменить может тот, кто пригласил, или организатор
+        invitations_to_cancel = EventParticipant.objects.filter(
             id=participant_id,
             event_id=event_id,
-            invited_by=request.user,  # Только тот кто пригласил может отменить
             status='invited'  # Только ожидающие ответа
         )
+        if not access.for_request(request).is_organizer(event_id):
+            invitations_to_cancel = invitations_to_cancel.filter(invited_by=request.user)
+        participant = invitations_to_cancel.get()
 
         # Удаляем приглашение
         participant.delete()
@@ -1003,29 +849,21 @@ def notifications_view(request):
 @login_required
 def get_my_participant_api(request, event_id):
     """Получить ID участника текущего пользователя для мероприятия"""
-    try:
-        event = Event.objects.get(id=event_id)
-        participant = EventParticipant.objects.filter(event=event, user=request.user).first()
-
-        if participant:
-            return JsonResponse({
-                'success': True,
-                'participant_id': participant.id,
-                'status': participant.status,
-                'status_display': participant.get_status_display()
-            })
-        else:
-            return JsonResponse({
-                'success': False,
-                'error': 'Вы не приглашены в это мероприятие',
-                'participant_id': None
-            })
+    participant_id, status = access.for_request(request).participation(event_id)
 
-    except Event.DoesNotExist:
+    if participant_id:
+        return JsonResponse({
+            'success': True,
+            'participant_id': participant_id,
+            'status': status,
+            'status_display': dict(EventParticipant.STATUS_CHOICES).get(status, status)
+        })
+    else:
         return JsonResponse({
             'success': False,
-            'error': 'Мероприятие не найдено'
-        }, status=404)
+            'error': 'Вы не приглашены в это мероприятие',
+            'participant_id': None
+        })
 
 
 @login_required
@@ -1033,9 +871,8 @@ def get_my_participant_api(request, event_id):
 def clear_notifications_api(request):
     """Удалить все уведомления пользователя"""
     try:
-        # Удаляем все уведомления пользователя
-        count = Notification.objects.filter(user=request.user).count()
-        Notification.objects.filter(user=request.user).delete()
+        # Удаляем все уведомления пользователя (порциями)
+        count = notifications.clear_user_notifications(request.user.id)
 
         return JsonResponse({
             'success': True,
@@ -1055,8 +892,10 @@ def clear_notifications_api(request):
 def mark_all_read_api(request):
     """Пометить все уведомления как прочитанные"""
     try:
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
-        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        with transaction.atomic():
+            count = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+            notifications.set_unread(request.user.id, 0)
+        notifications.publish_unread_count(request.user.id, 0)
 
         return JsonResponse({
             'success': True,
@@ -1077,20 +916,19 @@ def mark_all_read_api(request):
 def leave_event_view(request, event_id):
     """Выйти из мероприятия (для участников)"""
     try:
-        event = Event.objects.get(id=event_id)
-        participant = EventParticipant.objects.get(
-            event=event,
-            user=request.user,
-            status__in=['accepted', 'confirmed']
-        )
+        participant_id, status = access.for_request(request).participation(event_id)
+        if status not in ('accepted', 'confirmed'):
+            raise EventParticipant.DoesNotExist
+        participant = EventParticipant.objects.select_related('event').get(id=participant_id)
+        event = participant.event
 
         # Изменяем статус на declined или удаляем
         participant.status = 'declined'
         participant.save()
 
         # Уведомление для организатора
-        Notification.objects.create(
-            user=event.user,
+        notifications.notify_many(
+            [event.user_id],
             notification_type='event_update',
             title='Участник покинул мероприятие',
             message=f'{request.user.username} покинул ваше мероприятие "{event.title}"',
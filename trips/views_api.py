@@ -1,15 +1,90 @@
 # trips/views_api.py
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
 import json
+import math
+from datetime import datetime, time
+from django.db.models import Count, Max, Q
 from django.utils import timezone
-from .models import Event, Expense
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import CalendarFeedToken, Event, Expense
+from . import access, clustering, event_payload, expenses, geo, geocoding, ledger, search, settlement, tasks
+from .ical import iter_calendar
+from .listing import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate_keyset, user_events
+from .recurrence import expand_events
 
 from trips.forms import EventForm
 
+# Ограничение количества точек на карте за один запрос
+MAP_EVENTS_LIMIT = 1000
+MAP_EVENTS_MAX_LIMIT = 5000
+
+# Цвета мероприятий в календаре по типу
+EVENT_COLORS = {
+    'meeting': '#0d6efd',
+    'party': '#dc3545',
+    'conference': '#198754',
+    'training': '#ffc107',
+    'trip': '#6610f2',
+    'other': '#6c757d'
+}
+
+
+def _parse_window_bound(value):
+    """Граница окна календаря: ISO-дата или дата со временем (как шлет FullCalendar)"""
+    if not value:
+        return None
+    # '+' смещения часового пояса в query string приходит пробелом
+    value = value.strip().replace(' ', '+')
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Неверный формат даты: {value}')
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def get_calendar_window(request):
+    """Окно [start, end) из параметров запроса. Любая из границ может отсутствовать"""
+    start = _parse_window_bound(request.GET.get('start'))
+    end = _parse_window_bound(request.GET.get('end'))
+    if start and end and end <= start:
+        raise ValueError('Конец периода должен быть позже начала')
+    return start, end
+
+
+def events_in_window(user, start=None, end=None):
+    """Активные мероприятия пользователя, пересекающиеся с окном [start, end).
+
+    Верхняя граница идет по индексу (user, is_active, start_datetime),
+    многодневные события попадают в окно по end_datetime. Серии повторяющихся
+    мероприятий возвращаются одной записью - вхождения разворачивает expand_events.
+    """
+    events = Event.objects.filter(user=user, is_active=True)
+    if end is not None:
+        events = events.filter(start_datetime__lt=end)
+    if start is not None:
+        single = Q(recurrence_frequency='none') & (
+            Q(end_datetime__gte=start) |
+            Q(end_datetime__isnull=True, start_datetime__gte=start)
+        )
+        series = ~Q(recurrence_frequency='none') & (
+            Q(recurrence_until__isnull=True) |
+            Q(recurrence_until__gte=timezone.localdate(start))
+        )
+        events = events.filter(single | series)
+    return events
+
 
 # 1. Простой тестовый API
 @login_required
@@ -73,32 +148,20 @@ def get_my_events_api(request):
     print(f"=== GET MY EVENTS API (календарь): user={request.user.username} ===")
 
     try:
-        # Получаем реальные мероприятия из БД
-        events = Event.objects.filter(user=request.user, is_active=True).order_by('-start_datetime')
-        print(f"Найдено мероприятий в БД: {events.count()}")
+        start, end = get_calendar_window(request)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    try:
+        # Получаем из БД только мероприятия, попадающие в запрошенный период
+        events = events_in_window(request.user, start, end)
+        occurrences = sorted(expand_events(events, start, end), key=lambda item: item[1], reverse=True)
 
         events_list = []
-        for event in events:
+        for event, occurrence_start, occurrence_end in occurrences:
             # Форматируем дату для календаря
-            event_date = ''
-            event_time = ''
-            if event.start_datetime:
-                event_date = event.start_datetime.strftime('%d.%m.%Y')
-                event_time = event.start_datetime.strftime('%H:%M')
-
-            # Получаем тип мероприятия
-            event_type = event.get_event_type_display()
-
-            # Определяем цвет по типу
-            color_map = {
-                'Встреча': '#0d6efd',
-                'Вечеринка': '#dc3545',
-                'Конференция': '#198754',
-                'Тренинг': '#ffc107',
-                'Поездка': '#6610f2',
-                'Другое': '#6c757d'
-            }
-            event_color = color_map.get(event_type, '#6c757d')
+            event_date = occurrence_start.strftime('%d.%m.%Y')
+            event_time = occurrence_start.strftime('%H:%M')
 
             events_list.append({
                 'id': event.id,
@@ -106,14 +169,18 @@ def get_my_events_api(request):
                 'description': event.description or '',
                 'date': event_date,
                 'time': event_time,
+                'start': occurrence_start.isoformat(),
+                'end': occurrence_end.isoformat() if occurrence_end else None,
+                'recurring': event.is_recurring,
                 'address': event.get_location_display() or '',
-                'type': event_type,
-                'color': event_color,
+                'type': event.get_event_type_display(),
+                'color': EVENT_COLORS.get(event.event_type, '#6c757d'),
                 'created_at': event.created_at.strftime('%d.%m.%Y %H:%M') if event.created_at else '',
                 'creator': request.user.username,
                 'allDay': False  # Для FullCalendar
             })
-            print(f"  - ID:{event.id} '{event.title}' - {event_date} {event_time}")
+
+        print(f"Найдено мероприятий в БД: {len(events_list)}")
 
         return JsonResponse({
             'status': 'success',
@@ -131,6 +198,40 @@ def get_my_events_api(request):
         }, status=500)
 
 
+@login_required
+def get_my_events_page_api(request):
+    """Страница «моих мероприятий» (организатор + участник) с keyset-пагинацией"""
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+        events, next_cursor = paginate_keyset(user_events(request.user), request.GET.get('cursor'), limit)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    access.for_request(request).roles_for(events)
+
+    events_list = []
+    for event in events:
+        events_list.append({
+            'id': event.id,
+            'title': event.title,
+            'description': event.description or '',
+            'date': event.start_datetime.strftime('%d.%m.%Y'),
+            'time': event.start_datetime.strftime('%H:%M'),
+            'start': event.start_datetime.isoformat(),
+            'address': event.get_location_display() or '',
+            'type': event.get_event_type_display(),
+            'created_at': event.created_at.strftime('%d.%m.%Y %H:%M') if event.created_at else '',
+            'creator': event.user.username,
+            'role': event.viewer_role,
+            'participant_id': event.viewer_participant_id,
+        })
+
+    return JsonResponse({
+        'status': 'success',
+        'events': events_list,
+        'next_cursor': next_cursor,
+    })
+
+
 # 4. API для удаления мероприятия
 @login_required
 @csrf_exempt
@@ -191,8 +292,10 @@ def delete_event_view(request, event_id):
     """Удаление мероприятия (мягкое удаление)"""
     if request.method == 'POST':
         try:
-            # Находим мероприятие текущего пользователя
-            event = Event.objects.get(id=event_id, user=request.user)
+            # Удалять может только организатор
+            event = access.for_request(request).get_event(event_id, {access.ORGANIZER})
+            if event is None:
+                raise Event.DoesNotExist
 
             # Мягкое удаление - помечаем как неактивное
             event.is_active = False
@@ -230,37 +333,32 @@ def get_calendar_events_api(request):
     print(f"=== GET CALENDAR EVENTS API ===")
 
     try:
-        events = Event.objects.filter(user=request.user, is_active=True)
+        start, end = get_calendar_window(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    try:
+        events = events_in_window(request.user, start, end)
 
         events_list = []
-        for event in events:
-            if event.start_datetime:
+        for event, occurrence_start, occurrence_end in expand_events(events, start, end):
+            if occurrence_start:
                 # Для FullCalendar нужен формат ISO
-                start_iso = event.start_datetime.isoformat()
+                start_iso = occurrence_start.isoformat()
                 end_iso = None
-                if event.end_datetime:
-                    end_iso = event.end_datetime.isoformat()
-
-                # Определяем цвет
-                color_map = {
-                    'meeting': '#0d6efd',
-                    'party': '#dc3545',
-                    'conference': '#198754',
-                    'training': '#ffc107',
-                    'trip': '#6610f2',
-                    'other': '#6c757d'
-                }
-                event_color = color_map.get(event.event_type, '#6c757d')
+                if occurrence_end:
+                    end_iso = occurrence_end.isoformat()
 
                 events_list.append({
                     'id': event.id,
+                    'groupId': event.id if event.is_recurring else None,
                     'title': event.title,
                     'start': start_iso,
                     'end': end_iso,
                     'description': event.description or '',
                     'location': event.get_location_display() or '',
                     'type': event.get_event_type_display(),
-                    'color': event_color,
+                    'color': EVENT_COLORS.get(event.event_type, '#6c757d'),
                     'textColor': '#ffffff',
                     'url': f'/events/{event.id}/',  # Ссылка на страницу события
                     'extendedProps': {
@@ -277,16 +375,275 @@ def get_calendar_events_api(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@login_required
+def calendar_feed_token_api(request):
+    """Ссылка на подписку .ics. POST выпускает новый токен - старая ссылка перестает работать"""
+    feed_token, created = CalendarFeedToken.objects.get_or_create(
+        user=request.user,
+        defaults={'token': CalendarFeedToken.generate_token()}
+    )
+    if request.method == 'POST' and not created:
+        feed_token.regenerate()
+
+    return JsonResponse({
+        'status': 'success',
+        'url': request.build_absolute_uri(reverse('calendar_feed_ics', args=[feed_token.token]))
+    })
+
+
+def calendar_feed_ics(request, token):
+    """Подписка на календарь пользователя в формате iCalendar (Google, Apple, Outlook).
+
+    Внешние клиенты опрашивают ленту часто, поэтому сначала одним агрегатом по индексу
+    (user, updated_at) проверяем, менялось ли что-нибудь, и при необходимости отвечаем 304.
+    """
+    try:
+        start, end = get_calendar_window(request)
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
+
+    # Токен и состояние мероприятий - одним запросом. Мягко удаленные мероприятия
+    # тоже учитываем: их удаление должно менять ETag
+    state = CalendarFeedToken.objects.filter(token=token).values('user_id').annotate(
+        last_modified=Max('user__event__updated_at'),
+        total=Count('user__event')
+    ).order_by('user_id').first()
+    if state is None:
+        return HttpResponse(status=404)
+
+    changed_at = state['last_modified'].timestamp() if state['last_modified'] else 0
+    last_modified = int(changed_at)
+    etag = quote_etag(f"{state['user_id']}-{changed_at}-{state['total']}")
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    user = User.objects.get(pk=state['user_id'])
+    events = events_in_window(user, start, end).order_by('start_datetime').iterator(chunk_size=500)
+    base_url = request.build_absolute_uri('/').rstrip('/')
+
+    response = StreamingHttpResponse(
+        iter_calendar(events, base_url, f'Мероприятия {user.username}'),
+        content_type='text/calendar; charset=utf-8'
+    )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Content-Disposition'] = 'inline; filename="calendar.ics"'
+    return response
+
+
+def _float_param(request, name):
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        result = float(value)
+    except ValueError:
+        raise ValueError(f'Параметр {name} должен быть числом')
+    # float() пропускает nan, inf и 1e400 - дальше на них падает math.ceil в geo
+    if not math.isfinite(result):
+        raise ValueError(f'Параметр {name} должен быть конечным числом')
+    return result
+
+
+def _bbox_error(south, west, north, east):
+    """Текст ошибки для области вне -90..90 / -180..180 или None"""
+    if not (geocoding.valid_coords(south, west) and geocoding.valid_coords(north, east)):
+        return 'south и north должны быть в -90..90, west и east - в -180..180'
+    return None
+
+
+@login_required
+def get_map_events_api(request):
+    """Мероприятия на карте: внутри видимой области (south, west, north, east)
+    или в радиусе radius км от точки (lat, lng), по возрастанию расстояния.
+
+    Отбор идет по индексу геохеша, сортировка и LIMIT - в БД; точное расстояние
+    считается только для отданной страницы.
+    """
+    try:
+        south, west, north, east = (_float_param(request, name) for name in ('south', 'west', 'north', 'east'))
+        center_lat, center_lng = _float_param(request, 'lat'), _float_param(request, 'lng')
+        radius = _float_param(request, 'radius')
+        limit = max(1, min(int(request.GET.get('limit', MAP_EVENTS_LIMIT)), MAP_EVENTS_MAX_LIMIT))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    if center_lat is not None and center_lng is not None and not geocoding.valid_coords(center_lat, center_lng):
+        return JsonResponse({'status': 'error', 'message': 'lat должна быть в -90..90, lng - в -180..180'}, status=400)
+
+    if radius is not None:
+        if center_lat is None or center_lng is None or radius <= 0:
+            return JsonResponse({'status': 'error', 'message': 'Для поиска по радиусу нужны lat, lng и radius > 0'},
+                                status=400)
+        south, west, north, east = geo.radius_bbox(center_lat, center_lng, radius)
+    elif None in (south, west, north, east):
+        return JsonResponse({'status': 'error', 'message': 'Укажите область south, west, north, east'}, status=400)
+    else:
+        error = _bbox_error(south, west, north, east)
+        if error:
+            return JsonResponse({'status': 'error', 'message': error}, status=400)
+        if center_lat is None or center_lng is None:
+            center_lat = (south + north) / 2
+            center_lng = (west + east) / 2 if west <= east else ((west + east + 360) / 2 + 180) % 360 - 180
+
+    events = user_events(request.user).filter(geo.bbox_q(south, west, north, east)).annotate(
+        distance=geo.squared_distance(center_lat, center_lng)
+    ).order_by('distance', 'id').values(
+        'id', 'title', 'latitude', 'longitude', 'address', 'event_type', 'start_datetime'
+    )[:limit]
+    roles = access.for_request(request).roles_for(event['id'] for event in events)
+
+    event_types = dict(Event.EVENT_TYPES)
+    events_list = []
+    for event in events:
+        distance_km = geo.haversine_km(center_lat, center_lng, event['latitude'], event['longitude'])
+        if radius is not None and distance_km > radius:
+            continue
+        events_list.append({
+            'id': event['id'],
+            'title': event['title'],
+            'lat': event['latitude'],
+            'lng': event['longitude'],
+            'address': event['address'],
+            'type': event_types.get(event['event_type'], event['event_type']),
+            'start': event['start_datetime'].isoformat(),
+            'role': roles[event['id']],
+            'distance_km': round(distance_km, 3),
+        })
+
+    return JsonResponse({
+        'status': 'success',
+        'mode': 'points',
+        'events': events_list,
+        'count': len(events_list),
+        'truncated': len(events) == limit,
+    })
+
+
+@login_required
+def get_map_clusters_api(request):
+    """Кластеры мероприятий в видимой области для масштаба zoom.
+
+    Кластеры предрассчитаны (trips/clustering.py), поэтому запрос читает
+    не больше нескольких десятков строк независимо от числа мероприятий.
+    На крупном масштабе отдаются отдельные точки, как в get_map_events_api.
+    """
+    try:
+        zoom = int(request.GET.get('zoom', ''))
+        south, west, north, east = (_float_param(request, name) for name in ('south', 'west', 'north', 'east'))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Укажите zoom и область south, west, north, east'},
+                            status=400)
+    if None in (south, west, north, east):
+        return JsonResponse({'status': 'error', 'message': 'Укажите область south, west, north, east'}, status=400)
+    error = _bbox_error(south, west, north, east)
+    if error:
+        return JsonResponse({'status': 'error', 'message': error}, status=400)
+
+    zoom = max(clustering.MIN_ZOOM, min(zoom, clustering.MAX_ZOOM))
+    precision = clustering.zoom_to_precision(zoom)
+    if precision is None:
+        return get_map_events_api(request)
+
+    clusters_list = []
+    for cluster in clustering.clusters_in_bbox(request.user, precision, south, west, north, east):
+        latitude, longitude = cluster.centroid
+        clusters_list.append({
+            'cell': cluster.cell,
+            'count': cluster.count,
+            'lat': latitude,
+            'lng': longitude,
+            'bounds': geo.decode_bounds(cluster.cell),
+            'event_ids': cluster.event_ids,
+        })
+
+    return JsonResponse({
+        'status': 'success',
+        'mode': 'clusters',
+        'precision': precision,
+        'clusters': clusters_list,
+        'count': len(clusters_list),
+    })
+
+
+@login_required
+@require_GET
+def geocode_api(request):
+    """Кэш геокодирования для карты и формы мероприятия.
+
+    ?address=... - координаты адреса, ?lat=&lng= - адрес точки.
+    """
+    try:
+        latitude, longitude = _float_param(request, 'lat'), _float_param(request, 'lng')
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    if request.GET.get('address'):
+        result = geocoding.geocode(request.GET['address'])
+    elif latitude is not None and longitude is not None:
+        if not geocoding.valid_coords(latitude, longitude):
+            return JsonResponse({'status': 'error', 'message': 'lat должна быть в -90..90, lng - в -180..180'}, status=400)
+        result = geocoding.reverse(latitude, longitude)
+    else:
+        return JsonResponse({'status': 'error', 'message': 'Укажите address или lat и lng'}, status=400)
+
+    if result is None:
+        return JsonResponse({'status': 'not_found'}, status=404)
+    return JsonResponse({
+        'status': 'success',
+        'address': result.address,
+        'lat': result.latitude,
+        'lng': result.longitude,
+    })
+
+
+@login_required
+def search_events_api(request):
+    """Полнотекстовый поиск по мероприятиям, доступным пользователю, по релевантности"""
+    text = request.GET.get('q', '').strip()
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+        page_size = max(1, min(int(request.GET.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'page и page_size должны быть числами'}, status=400)
+    if not text:
+        return JsonResponse({'status': 'error', 'message': 'Укажите поисковый запрос q'}, status=400)
+
+    events, has_next = search.search_events(user_events(request.user), text, page, page_size)
+    access.for_request(request).roles_for(events)
+
+    event_types = dict(Event.EVENT_TYPES)
+    return JsonResponse({
+        'status': 'success',
+        'events': [{
+            'id': event.id,
+            'title': event.title,
+            'description': event.description,
+            'address': event.address,
+            'type': event_types.get(event.event_type, event.event_type),
+            'start': event.start_datetime.isoformat(),
+            'organizer': event.user.username,
+            'role': event.viewer_role,
+        } for event in events],
+        'page': page,
+        'has_next': has_next,
+    })
+
+
 # API для системы денег и задач
 @login_required
 def get_event_expenses(request, event_id):
-    """Получение расходов мероприятия"""
+    """Получение расходов мероприятия (организатор и участники)"""
     try:
-        event = Event.objects.get(id=event_id, user=request.user)
-        expenses = Expense.objects.filter(event=event)
+        event = access.for_request(request).get_event(event_id, access.MEMBER_ROLES)
+        if event is None:
+            raise Event.DoesNotExist
+        event_expenses = Expense.objects.filter(event=event).select_related('paid_by')
 
         expenses_data = []
-        for expense in expenses:
+        for expense in event_expenses:
             expenses_data.append({
                 'id': expense.id,
                 'title': expense.title,
@@ -306,23 +663,51 @@ def get_event_expenses(request, event_id):
         return JsonResponse({'status': 'error', 'message': 'Мероприятие не найдено'}, status=404)
 
 
+@login_required
+def get_event_balances(request, event_id):
+    """Балансы участников и минимальный набор переводов для расчета"""
+    if not access.for_request(request).is_member(event_id):
+        return JsonResponse({'status': 'error', 'message': 'Мероприятие не найдено'}, status=404)
+
+    result = settlement.settle_up(event_id)
+    return JsonResponse({
+        'status': 'success',
+        'balances': [dict(row, balance=float(row['balance'])) for row in result['balances']],
+        'transfers': [dict(row, amount=float(row['amount'])) for row in result['transfers']],
+    })
+
+
+@login_required
+def get_my_ledger_api(request):
+    """Кто должен мне и кому должен я - по всем мероприятиям сразу"""
+    balances = ledger.user_balances(request.user)
+    return JsonResponse({
+        'status': 'success',
+        'balances': [{
+            'user_id': other.id,
+            'username': other.username,
+            'amount': float(amount),
+        } for other, amount in balances],
+        'owed_to_me': float(sum(amount for _, amount in balances if amount > 0)),
+        'i_owe': float(-sum(amount for _, amount in balances if amount < 0)),
+    })
+
+
 @login_required
 @require_POST
 @csrf_exempt
 def add_expense(request, event_id):
-    """Добавление расхода"""
+    """Добавление расхода с разделением на доли.
+
+    split: {"mode": "equal", "user_ids": [...]} или {"mode": "exact"|"percent"|"weights",
+    "shares": [{"user_id": 1, "value": "150.00"}, ...]}; без split - поровну на всех участников.
+    """
     try:
-        event = Event.objects.get(id=event_id, user=request.user)
+        event = access.for_request(request).get_event(event_id, access.MEMBER_ROLES)
+        if event is None:
+            raise Event.DoesNotExist
         data = json.loads(request.body)
-
-        # Создаем расход
-        expense = Expense.objects.create(
-            event=event,
-            title=data['title'],
-            amount=data['amount'],
-            paid_by_id=data['paid_by_id'],
-            created_by=request.user
-        )
+        expense = expenses.create_expenses(event, request.user, [data])[0]
 
         return JsonResponse({
             'status': 'success',
@@ -330,5 +715,156 @@ def add_expense(request, event_id):
             'expense_id': expense.id
         })
 
+    except Event.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Мероприятие не найдено'}, status=404)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
     except Exception as e:
-        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+
+@login_required
+@require_POST
+@csrf_exempt
+def add_expenses_batch(request, event_id):
+    """Несколько расходов одним запросом (например, импорт чека): {"expenses": [...]}.
+
+    Формат расхода - как в add_expense. Если хоть один расход неверен, не создается ни один.
+    """
+    event = access.for_request(request).get_event(event_id, access.MEMBER_ROLES)
+    if event is None:
+        return JsonResponse({'status': 'error', 'message': 'Мероприятие не найдено'}, status=404)
+
+    try:
+        items = json.loads(request.body).get('expenses')
+        if not isinstance(items, list) or not items:
+            raise ValueError('Ожидается непустой список expenses')
+        if len(items) > expenses.MAX_BATCH_EXPENSES:
+            raise ValueError(f'Не больше {expenses.MAX_BATCH_EXPENSES} расходов за раз')
+        created = expenses.create_expenses(event, request.user, items)
+    except (json.JSONDecodeError, AttributeError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'message': f'Добавлено расходов: {len(created)}',
+        'expense_ids': [expense.id for expense in created]
+    })
+
+
+@login_required
+def get_task_board(request, event_id):
+    """Доска задач: колонки по статусам, карточки в порядке rank"""
+    event = access.for_request(request).get_event(event_id, access.MEMBER_ROLES)
+    if event is None:
+        return JsonResponse({'status': 'error', 'message': 'Мероприятие не найдено'}, status=404)
+
+    columns = tasks.board(event)
+    return JsonResponse({
+        'status': 'success',
+        'columns': tasks.serialize_board(columns),
+        'total': sum(len(column) for column in columns.values()),
+    })
+
+
+@login_required
+@require_POST
+@csrf_exempt
+def add_task(request, event_id):
+    """Новая задача в конце колонки: {"title", "description", "assigned_to_id", "due_date", "status"}"""
+    event = access.for_request(request).get_event(event_id, access.MEMBER_ROLES)
+    if event is None:
+        return JsonResponse({'status': 'error', 'message': 'Мероприятие не найдено'}, status=404)
+
+    try:
+        task = tasks.create_task(event, request.user, json.loads(request.body))
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'message': 'Задача добавлена',
+        'task': tasks.serialize_task(task)
+    })
+
+
+@login_required
+@require_POST
+@csrf_exempt
+def edit_task(request, event_id, task_id):
+    """Изменить карточку: {"title", "description", "assigned_to_id", "due_date"}"""
+    event = access.for_request(request).get_event(event_id, access.MEMBER_ROLES)
+    if event is None:
+        return JsonResponse({'status': 'error', 'message': 'Мероприятие не найдено'}, status=404)
+    task = event.tasks.select_related('assigned_to', 'created_by').filter(id=task_id).first()
+    if task is None:
+        return JsonResponse({'status': 'error', 'message': 'Задача не найдена'}, status=404)
+
+    try:
+        task = tasks.update_task(task, json.loads(request.body))
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'message': 'Задача обновлена',
+        'task': tasks.serialize_task(task)
+    })
+
+
+@login_required
+@require_POST
+@csrf_exempt
+def delete_task(request, event_id, task_id):
+    event = access.for_request(request).get_event(event_id, access.MEMBER_ROLES)
+    if event is None:
+        return JsonResponse({'status': 'error', 'message': 'Мероприятие не найдено'}, status=404)
+
+    deleted, _ = event.tasks.filter(id=task_id).delete()
+    if not deleted:
+        return JsonResponse({'status': 'error', 'message': 'Задача не найдена'}, status=404)
+    return JsonResponse({'status': 'success', 'message': 'Задача удалена'})
+
+
+@login_required
+@require_POST
+@csrf_exempt
+def move_tasks_batch(request, event_id):
+    """Перемещения карточек пачкой: {"moves": [{"id": 5, "status": "done", "after_id": 7}, ...]}.
+
+    after_id - карточка, под которую кладем (null - в начало колонки). Перемещения
+    применяются по порядку; если хоть одно неверно, не меняется ничего.
+    """
+    event = access.for_request(request).get_event(event_id, access.MEMBER_ROLES)
+    if event is None:
+        return JsonResponse({'status': 'error', 'message': 'Мероприятие не найдено'}, status=404)
+
+    try:
+        items = json.loads(request.body).get('moves')
+        if not isinstance(items, list) or not items:
+            raise ValueError('Ожидается непустой список moves')
+        if len(items) > tasks.MAX_BATCH_MOVES:
+            raise ValueError(f'Не больше {tasks.MAX_BATCH_MOVES} перемещений за раз')
+        changed = tasks.move_tasks(event, tasks.parse_moves(items))
+    except (json.JSONDecodeError, AttributeError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'updated': [{'id': task.id, 'status': task.status, 'rank': task.rank} for task in changed]
+    })
+
+
+@login_required
+def get_event_detail_api(request, event_id):
+    """Страница мероприятия одним запросом: ?sections=participants,expenses,tasks,friends (по умолчанию все)"""
+    try:
+        sections = event_payload.parse_sections(request.GET.get('sections', ''))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    event = access.for_request(request).get_event(event_id, queryset=Event.objects.select_related('user'))
+    if event is None:
+        return JsonResponse({'status': 'error', 'message': 'Мероприятие не найдено'}, status=404)
+
+    return JsonResponse(dict(event_payload.build_payload(event, request.user, sections), status='success'))